@@ -0,0 +1,118 @@
+import com.google.zxing.BinaryBitmap;
+import com.google.zxing.DecodeHintType;
+import com.google.zxing.MultiFormatReader;
+import com.google.zxing.ReaderException;
+import com.google.zxing.Result;
+import com.google.zxing.ResultPoint;
+import com.google.zxing.client.j2se.BufferedImageLuminanceSource;
+import com.google.zxing.client.result.ParsedResult;
+import com.google.zxing.client.result.ResultParser;
+import com.google.zxing.common.HybridBinarizer;
+
+import javax.imageio.ImageIO;
+import java.awt.image.BufferedImage;
+import java.io.BufferedReader;
+import java.io.ByteArrayInputStream;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.net.URI;
+import java.nio.charset.StandardCharsets;
+import java.util.Base64;
+import java.util.EnumMap;
+import java.util.Map;
+
+/**
+ * Long-lived ZXing decode worker.
+ *
+ * Reads one request per line on stdin and writes the result in the same text
+ * format as CommandLineRunner, followed by a line containing only "@@END@@".
+ * A request is a file URI, a plain path, or "b64:" followed by the
+ * base64-encoded bytes of a PNG/JPEG so callers can decode in-memory images
+ * without touching the disk. "PING" is answered with "PONG" so the Python
+ * client can check the JVM is alive.
+ *
+ * Run with the source launcher (Java 11+), no compile step needed:
+ *   java -cp javase-3.5.0.jar:core-3.5.0.jar:jcommander-1.82.jar ZXingWorker.java
+ */
+public class ZXingWorker {
+
+  static final String END = "@@END@@";
+
+  public static void main(String[] args) throws Exception {
+    BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+    PrintStream out = new PrintStream(new FileOutputStream(FileDescriptor.out), false, "UTF-8");
+
+    Map<DecodeHintType, Object> hints = new EnumMap<>(DecodeHintType.class);
+    hints.put(DecodeHintType.TRY_HARDER, Boolean.TRUE);
+    MultiFormatReader reader = new MultiFormatReader();
+    reader.setHints(hints);
+
+    String line;
+    while ((line = in.readLine()) != null) {
+      line = line.trim();
+      if (line.isEmpty()) {
+        continue;
+      }
+      if (line.equals("PING")) {
+        out.println("PONG");
+      } else {
+        out.print(decode(reader, line));
+      }
+      out.println(END);
+      out.flush();
+    }
+  }
+
+  static BufferedImage load(String request) throws Exception {
+    if (request.startsWith("b64:")) {
+      byte[] bytes = Base64.getDecoder().decode(request.substring(4));
+      return ImageIO.read(new ByteArrayInputStream(bytes));
+    }
+    if (request.startsWith("file:")) {
+      return ImageIO.read(URI.create(request).toURL());
+    }
+    return ImageIO.read(new File(request));
+  }
+
+  static String decode(MultiFormatReader reader, String request) {
+    String uri = request.startsWith("b64:") ? "memory" : request;
+    try {
+      BufferedImage image = load(request);
+      if (image == null) {
+        return uri + ": Could not load image\n";
+      }
+      BinaryBitmap bitmap = new BinaryBitmap(new HybridBinarizer(new BufferedImageLuminanceSource(image)));
+      Result result;
+      try {
+        result = reader.decodeWithState(bitmap);
+      } catch (ReaderException e) {
+        return uri + ": No barcode found\n";
+      } finally {
+        reader.reset();
+      }
+      return format(uri, result);
+    } catch (Exception e) {
+      return uri + ": Error: " + e + "\n";
+    }
+  }
+
+  static String format(String uri, Result result) {
+    ParsedResult parsed = ResultParser.parseResult(result);
+    StringBuilder sb = new StringBuilder();
+    sb.append(uri).append(" (format: ").append(result.getBarcodeFormat())
+        .append(", type: ").append(parsed.getType()).append("):\n");
+    sb.append("Raw result:\n").append(result.getText()).append('\n');
+    sb.append("Parsed result:\n").append(parsed.getDisplayResult()).append('\n');
+    ResultPoint[] points = result.getResultPoints();
+    int count = points == null ? 0 : points.length;
+    sb.append("Found ").append(count).append(" result points.\n");
+    for (int i = 0; i < count; i++) {
+      sb.append("  Point ").append(i).append(": (")
+          .append(points[i].getX()).append(',').append(points[i].getY()).append(")\n");
+    }
+    return sb.toString();
+  }
+}
@@ -0,0 +1,172 @@
+import atexit
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from metrics import incr, span
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# DECODE_HEADLESS=1 never opens a window (auto when there is no display)
+HEADLESS = os.environ.get("DECODE_HEADLESS", "")
+# DECODE_ANNOTATE=0 skips annotated output entirely
+ANNOTATE = os.environ.get("DECODE_ANNOTATE", "1") not in ("", "0")
+# Fraction of annotated images actually written (1.0 = all)
+SAMPLE_RATE = float(os.environ.get("DECODE_ANNOTATE_SAMPLE", "1.0"))
+# cv2 PNG compression 0-9: 1 encodes faster than cv2's default 3, for a slightly larger file
+PNG_COMPRESSION = int(os.environ.get("DECODE_PNG_COMPRESSION", "1"))
+WRITER_THREADS = int(os.environ.get("DECODE_ANNOTATE_WORKERS", "2"))
+# Images waiting to be written; beyond this new ones are dropped, never waited for
+MAX_PENDING = int(os.environ.get("DECODE_ANNOTATE_MAX_PENDING", "32"))
+
+COLOR = (0, 255, 0)
+
+
+def is_headless():
+    """True when no window should be shown (set explicitly or no display available)."""
+    if HEADLESS:
+        return HEADLESS not in ("0",)
+    if sys.platform.startswith("linux"):
+        return not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+    return False
+
+
+# -----------------------------
+# FUNCTION: Draw annotations
+# -----------------------------
+def render(image, annotations, color=COLOR):
+    """Draw (polygon, label) pairs on ``image`` in place and return it."""
+    for polygon, label in annotations:
+        if not polygon:
+            continue
+        points = np.array(polygon, dtype=np.int32).reshape((-1, 1, 2))
+        cv2.polylines(image, [points], True, color, 2)
+        if label:
+            x, y = points[0][0]
+            cv2.putText(image, str(label), (int(x), int(y) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+    return image
+
+
+def show(title, image):
+    """Show ``image`` and wait for a key, unless running headless."""
+    if is_headless():
+        return
+    cv2.imshow(title, image)
+    print("Press any key to close the window.")
+    cv2.waitKey(0)
+    cv2.destroyAllWindows()
+
+
+# -----------------------------
+# CLASS: Background writer
+# -----------------------------
+class AnnotationWriter:
+    """Renders annotations and writes PNGs on a small thread pool.
+
+    ``submit()`` returns at once: drawing, PNG encoding and the file write
+    all happen on the writer threads (cv2 releases the GIL for them). Only
+    ``sample_rate`` of the submitted images are written, chosen evenly, and
+    when ``max_pending`` writes are already queued new ones are dropped
+    rather than waited for. Pending writes are flushed at exit.
+    """
+
+    def __init__(self, threads=WRITER_THREADS, sample_rate=SAMPLE_RATE, compression=PNG_COMPRESSION,
+                 max_pending=MAX_PENDING, enabled=ANNOTATE):
+        self.enabled = enabled
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.compression = compression
+        self.max_pending = max_pending
+        self.stats = {"submitted": 0, "sampled_out": 0, "dropped": 0, "written": 0, "errors": 0}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="annotate")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._credit = 0.0
+
+    def _take(self):
+        # Deterministic sampling: keep exactly sample_rate of the submissions
+        with self._lock:
+            self.stats["submitted"] += 1
+            self._credit += self.sample_rate
+            if self._credit < 1.0:
+                self.stats["sampled_out"] += 1
+                return False
+            self._credit -= 1.0
+            if self._pending >= self.max_pending:
+                self.stats["dropped"] += 1
+                incr("annotations", result="dropped")
+                return False
+            self._pending += 1
+            return True
+
+    def submit(self, image, annotations, path, color=COLOR, copy=True):
+        """Queue ``image`` (ndarray or path) with (polygon, label) pairs to be written to ``path``.
+
+        Returns a Future, or None when the image was sampled out, dropped or
+        output is disabled. Pass ``copy=False`` when the caller no longer
+        uses the array.
+        """
+        if not self.enabled or not self._take():
+            return None
+        if copy and isinstance(image, np.ndarray):
+            image = image.copy()
+        return self._executor.submit(self._write, image, list(annotations), path, color)
+
+    def _write(self, image, annotations, path, color):
+        try:
+            with span("annotate_write"):
+                if not isinstance(image, np.ndarray):
+                    source = image
+                    image = cv2.imread(source)
+                    if image is None:
+                        raise ValueError(f"Unable to read image '{source}'")
+                render(image, annotations, color)
+                params = [cv2.IMWRITE_PNG_COMPRESSION, self.compression] if path.lower().endswith(".png") else []
+                if not cv2.imwrite(path, image, params):
+                    raise OSError(f"Could not write {path}")
+            with self._lock:
+                self.stats["written"] += 1
+            incr("annotations", result="written")
+            print(f"Annotated image saved as {path}")
+            return path
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            incr("annotations", result="error")
+            print(f"Warning: annotation not written ({e})", file=sys.stderr)
+            return None
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def close(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_default_writer = None
+_default_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Return the shared process-wide writer (created on first use, flushed at exit)."""
+    global _default_writer
+    with _default_writer_lock:
+        if _default_writer is None:
+            _default_writer = AnnotationWriter()
+            atexit.register(_default_writer.close)
+        return _default_writer
+
+
+def annotate(image, annotations, path, title=None):
+    """Write the annotated image in the background; also show it when a display is available.
+
+    The GUI copy is rendered here, on the caller's thread, only when it
+    will actually be shown. The write never waits for the window.
+    """
+    get_writer().submit(image, annotations, path)
+    if title and not is_headless():
+        show(title, render(image.copy(), annotations))
@@ -3,40 +3,59 @@ import cv2
 import numpy as np
 import sys
 
+from annotation_writer import annotate
+from decode_cache import cached
+from localize import decode_regions, format_report
+from pyramid import decode_pyramid
+
+# Streaming mode: barcode-decoder.py --video <video file or camera index> [--show]
+if len(sys.argv) > 2 and sys.argv[1] == "--video":
+    from stream_decode import main as stream_main
+    sys.exit(stream_main([sys.argv[2], "--mode", "barcode"] + sys.argv[3:]))
+
 # Allow passing the image path via CLI, fallback to default
 barcode_image = sys.argv[1] if len(sys.argv) > 1 else "barcode.png"
 
-# Read the image
-image = cv2.imread(barcode_image)
+# Read the image (the raw bytes also key the decode cache)
+try:
+    with open(barcode_image, "rb") as f:
+        image_bytes = f.read()
+except OSError:
+    image_bytes = b""
+image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR) if image_bytes else None
 
 if image is None:
     print(f"Error: Unable to read image '{barcode_image}'")
     print("Please provide a valid image path.")
     sys.exit(1)
 
-# Decode the barcode
-barcodes = decode(image)
+def decode_gray(gray):
+    return [
+        {"text": barcode.data.decode("utf-8"), "polygon": [(point.x, point.y) for point in barcode.polygon]}
+        for barcode in decode(gray)
+    ]
+
+def decode_view(view):
+    # Small grayscale copy first, larger levels only if nothing was found
+    found, level = decode_pyramid(view, decode_gray)
+    return found
+
+def decode_barcodes():
+    # Padded crops of likely barcode regions first, full frame only as fallback
+    found, report = decode_regions(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), decode_view)
+    print(format_report(report))
+    for barcode in found:
+        print(f"Pyramid level {barcode['pyramid_level']} (scale {barcode['pyramid_scale']}) decoded: {barcode['text']}")
+    return found
+
+# Decode the barcode (skipped when this exact image was seen before)
+barcodes = cached(image_bytes, "barcode-decoder-roi-pyramid", decode_barcodes)
 for barcode in barcodes:
-    data = barcode.data.decode("utf-8")
-    print(f"Barcode Data: {data}")
-    # Draw a rectangle around the barcode
-    points = barcode.polygon
-    points = [(point.x, point.y) for point in points]
-    cv2.polylines(image, [np.array(points, dtype=np.int32)], True, (0, 255, 0), 2)
-
-    # Annotate the decoded data beside the bounding box
-    x, y = points[0]  # Take the first point of the bounding box
-    cv2.putText(image, data, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)  # Green text
+    print(f"Barcode Data: {barcode['text']}")
 
-# Display the image with the barcode highlighted and annotated
-cv2.imshow("Barcode with Annotation", image)
-
-# Wait for a key press
-key = cv2.waitKey(0)
-
-# Save the annotated image when a key is pressed
+# Outline each barcode with its data beside it. The PNG is written by a
+# background thread, and the window (skipped when headless) no longer
+# holds the save back.
 output_file = "decoded_barcode.png"
-cv2.imwrite(output_file, image)
-print(f"Annotated image saved as {output_file}")
-
-cv2.destroyAllWindows()
\ No newline at end of file
+annotate(image, [(barcode["polygon"], barcode["text"]) for barcode in barcodes], output_file,
+         "Barcode with Annotation")
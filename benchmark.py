@@ -0,0 +1,388 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+DEFAULT_IMAGES = [
+    "images/barcode-image.jpg",
+    "images/qrcode-image.jpg",
+    "images/code-image.jpg",
+    "images/encoded-image.jpg",
+    "images/maxi-code.png",
+    "rot90.jpg",
+    "rot180.jpg",
+    "rot270.jpg",
+]
+DEFAULT_REPEATS = 5
+# A stage counts as a regression when its median grows by more than this
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+# Synthetic corpus: every combination is written for every source image
+CORPUS_ANGLES = (0, 7, 90, 180)
+CORPUS_SCALES = (0.5, 1.0)
+CORPUS_NOISE = (0, 12)
+CORPUS_JPEG_QUALITY = (90, 35)
+
+
+# -----------------------------
+# FUNCTION: Synthetic corpus
+# -----------------------------
+def degrade(image, angle=0, scale=1.0, noise=0, jpeg_quality=None, seed=0):
+    """Rotated, scaled, noisy and/or JPEG-recompressed copy of ``image``."""
+    out = image
+    if scale != 1.0:
+        h, w = out.shape[:2]
+        out = cv2.resize(out, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    if angle in (90, 180, 270):
+        out = cv2.rotate(out, {90: cv2.ROTATE_90_CLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_COUNTERCLOCKWISE}[angle])
+    elif angle:
+        h, w = out.shape[:2]
+        matrix = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), angle, 1.0)
+        cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+        nw, nh = int(h * sin + w * cos), int(h * cos + w * sin)
+        matrix[0, 2] += nw / 2.0 - w / 2.0
+        matrix[1, 2] += nh / 2.0 - h / 2.0
+        out = cv2.warpAffine(out, matrix, (nw, nh), borderValue=(255, 255, 255))
+    if noise:
+        rng = np.random.default_rng(seed)
+        out = np.clip(out.astype(np.int16) + rng.normal(0, noise, out.shape).astype(np.int16), 0, 255).astype(np.uint8)
+    if jpeg_quality is not None:
+        ok, buf = cv2.imencode(".jpg", out, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+        if ok:
+            out = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    return out
+
+
+def make_corpus(sources, out_dir, angles=CORPUS_ANGLES, scales=CORPUS_SCALES, noise_levels=CORPUS_NOISE,
+                jpeg_qualities=CORPUS_JPEG_QUALITY):
+    """Write degraded variants of ``sources`` into ``out_dir``; returns their paths.
+
+    File names record the transform, e.g. ``qrcode-image_a7_s0.5_n12_q35.png``.
+    Variants are saved as PNG so the JPEG degradation is exactly the one
+    applied here.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for source in sources:
+        image = cv2.imread(source)
+        if image is None:
+            print(f"Warning: {source} could not be read, skipping.")
+            continue
+        stem = os.path.splitext(os.path.basename(source))[0]
+        for angle in angles:
+            for scale in scales:
+                for noise in noise_levels:
+                    for quality in jpeg_qualities:
+                        variant = degrade(image, angle, scale, noise, quality, seed=len(paths))
+                        path = os.path.join(out_dir, f"{stem}_a{angle}_s{scale}_n{noise}_q{quality}.png")
+                        cv2.imwrite(path, variant)
+                        paths.append(path)
+    return paths
+
+
+# -----------------------------
+# CLASS: Per-stage timer
+# -----------------------------
+class StageTimer:
+    """Collects wall-clock samples (ms) per stage name."""
+
+    def __init__(self):
+        self.samples = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {
+        "n": n,
+        "min_ms": round(ordered[0], 3),
+        "median_ms": round(ordered[n // 2], 3),
+        "mean_ms": round(sum(ordered) / n, 3),
+        "p95_ms": round(ordered[min(n - 1, int(n * 0.95))], 3),
+    }
+
+
+def annotate(image, results):
+    """Draw polygons and text the way the decoder scripts do, then encode a PNG."""
+    canvas = image.copy()
+    for result in results:
+        if result.get("polygon"):
+            points = np.array(result["polygon"], dtype=np.int32).reshape((-1, 1, 2))
+            cv2.polylines(canvas, [points], True, (0, 255, 0), 2)
+            x, y = points[0][0]
+            cv2.putText(canvas, str(result["text"])[:50], (int(x), int(y) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+    cv2.imencode(".png", canvas)
+
+
+def _load(path, timer):
+    with timer.stage("load"):
+        with open(path, "rb") as f:
+            data = f.read()
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Unable to read image '{path}'")
+    return data, image
+
+
+# -----------------------------
+# DECODERS: same pipelines as the scripts
+# -----------------------------
+def _unified(backend, localize, pyramid):
+    def run(path, timer, zxing_decode):
+        from unified_decoder import SharedImage, decode
+
+        data, image = _load(path, timer)
+        with timer.stage("decode"):
+            results = decode(SharedImage(data, path), [backend], cache=False, localize=localize, pyramid=pyramid)
+        with timer.stage("annotate"):
+            annotate(image, results)
+        return len(results)
+
+    return run
+
+
+def _zxing_single(path, timer, zxing_decode):
+    from zxing_batch import parse_output
+
+    data, image = _load(path, timer)
+    with timer.stage("decode"):
+        output = zxing_decode(data)
+    with timer.stage("parse"):
+        record = parse_output(output, path)
+    results = [{"text": record["raw"], "polygon": record["points"]}] if record["found"] else []
+    with timer.stage("annotate"):
+        annotate(image, results)
+    return len(results)
+
+
+def _zxing_rotations(path, timer, zxing_decode):
+    from localize import propose_regions
+    from zxing_batch import decode_found, parse_output
+    from zxing_worker import decode_first
+
+    data, image = _load(path, timer)
+    with timer.stage("rotate_write"):
+        candidates = []
+        for i, (x, y, w, h) in enumerate(propose_regions(image)):
+            ok, buf = cv2.imencode(".png", image[y:y + h, x:x + w])
+            if ok:
+                candidates.append((f"roi{i}", buf.tobytes()))
+        candidates.append(("original", data))
+        for name, code in (("rot90", cv2.ROTATE_90_CLOCKWISE), ("rot270", cv2.ROTATE_90_COUNTERCLOCKWISE),
+                           ("rot180", cv2.ROTATE_180)):
+            ok, buf = cv2.imencode(".png", cv2.rotate(image, code))
+            if ok:
+                candidates.append((name, buf.tobytes()))
+    with timer.stage("decode"):
+        _, output = decode_first(candidates, zxing_decode, decode_found,
+                                 int(os.environ.get("ZXING_ROTATION_WORKERS", "4")))
+    with timer.stage("parse"):
+        record = parse_output(output, path)
+    results = [{"text": record["raw"], "polygon": record["points"]}] if record["found"] else []
+    with timer.stage("annotate"):
+        annotate(image, results)
+    return len(results)
+
+
+DECODERS = {
+    "barcode-decoder.py": _unified("barcode", localize=True, pyramid=True),
+    "qrcode-decoder.py": _unified("qr", localize=True, pyramid=True),
+    "decode-pdfcode.py": _unified("pdf417", localize=True, pyramid=False),
+    "maxicode.py": _zxing_single,
+    "aztec_decoder.py": _zxing_rotations,
+    "datamatrix_decoder.py": _zxing_rotations,
+}
+
+
+def zxing_backend(kind):
+    """(decode(image) -> output, spawn-timing function) for the warm pool or the container."""
+    if kind == "container":
+        from zxing_container import ZXingContainer, get_container
+        from zxing_worker import ZXingWorker
+
+        def spawn():
+            # Container start plus one JVM worker inside it, ready to decode
+            container = ZXingContainer(workers=1)
+            try:
+                container.start()
+                worker = ZXingWorker(container.exec_command)
+                worker.start()
+                worker.stop()
+            finally:
+                container.stop()
+
+        return lambda image: get_container().decode(image), spawn
+
+    from zxing_worker import ZXingWorker, get_pool, image_request
+
+    def spawn():
+        worker = ZXingWorker()
+        try:
+            worker.start()
+        finally:
+            worker.stop()
+
+    return lambda image: get_pool().decode(image_request(image)), spawn
+
+
+# -----------------------------
+# FUNCTION: Run the suite
+# -----------------------------
+def run_benchmark(images, decoders=None, repeats=DEFAULT_REPEATS, zxing="pool", spawn_repeats=3):
+    """Time every stage of every decoder on every image; returns a JSON-ready report.
+
+    Each (decoder, image) pair runs once untimed to warm caches, pools and
+    imports, then ``repeats`` timed times. ZXing spawn cost (a fresh JVM
+    worker or container) is timed separately under the ``zxing`` entry.
+    Decoders whose dependencies are missing are reported as skipped.
+    """
+    decoders = decoders or list(DECODERS)
+    zxing_decode, spawn = zxing_backend(zxing)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "repeats": repeats,
+            "zxing": zxing,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": [],
+        "skipped": {},
+    }
+
+    if any(name in ("maxicode.py", "aztec_decoder.py", "datamatrix_decoder.py") for name in decoders):
+        timer = StageTimer()
+        try:
+            for _ in range(spawn_repeats):
+                with timer.stage("spawn"):
+                    spawn()
+            report["results"].append({"decoder": "zxing", "image": None, "stages": {"spawn": summarize(timer.samples["spawn"])}})
+        except Exception as e:
+            report["skipped"]["zxing spawn"] = f"{type(e).__name__}: {e}"
+
+    for name in decoders:
+        run = DECODERS[name]
+        for path in images:
+            timer = StageTimer()
+            try:
+                run(path, StageTimer(), zxing_decode)
+                for _ in range(repeats):
+                    decoded = run(path, timer, zxing_decode)
+            except ImportError as e:
+                report["skipped"][name] = f"missing dependency: {e}"
+                break
+            except Exception as e:
+                report["results"].append({"decoder": name, "image": path, "error": f"{type(e).__name__}: {e}"})
+                continue
+            report["results"].append({
+                "decoder": name,
+                "image": path,
+                "decoded": decoded,
+                "stages": {stage: summarize(samples) for stage, samples in timer.samples.items()},
+            })
+    report["summary"] = summary_medians(report)
+    return report
+
+
+def summary_medians(report):
+    """{decoder: {stage: median of per-image medians}} — the numbers compared against a baseline."""
+    per_stage = {}
+    for entry in report["results"]:
+        for stage, stats in entry.get("stages", {}).items():
+            per_stage.setdefault(entry["decoder"], {}).setdefault(stage, []).append(stats["median_ms"])
+    return {
+        decoder: {stage: round(sorted(values)[len(values) // 2], 3) for stage, values in stages.items()}
+        for decoder, stages in per_stage.items()
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """Per decoder/stage change against a baseline report; returns (rows, regressions)."""
+    rows = []
+    regressions = []
+    for decoder, stages in current["summary"].items():
+        for stage, median in stages.items():
+            before = baseline.get("summary", {}).get(decoder, {}).get(stage)
+            if before is None:
+                continue
+            change = (median - before) / before if before else 0.0
+            row = {"decoder": decoder, "stage": stage, "baseline_ms": before, "current_ms": median,
+                   "change": round(change, 4)}
+            rows.append(row)
+            if change > threshold:
+                regressions.append(row)
+    return rows, regressions
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every decoder stage by stage.")
+    parser.add_argument("images", nargs="*", help="images to benchmark (default: the repo samples)")
+    parser.add_argument("--decoders", default=",".join(DECODERS), help="comma-separated script names")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--zxing", choices=("pool", "container"), default="pool", help="ZXing path to time")
+    parser.add_argument("--synthetic", metavar="DIR", help="generate a degraded corpus in DIR and benchmark it too")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--save-baseline", metavar="PATH", help="also save the report as a baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against a saved baseline; exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="allowed median slowdown before a stage counts as a regression (0.1 = 10%%)")
+    args = parser.parse_args(argv)
+
+    images = args.images or [path for path in DEFAULT_IMAGES if os.path.exists(path)]
+    if args.synthetic:
+        images = images + make_corpus(images, args.synthetic)
+    decoders = [name.strip() for name in args.decoders.split(",") if name.strip()]
+    unknown = [name for name in decoders if name not in DECODERS]
+    if unknown:
+        parser.error(f"unknown decoders: {', '.join(unknown)}")
+
+    report = run_benchmark(images, decoders, args.repeats, args.zxing)
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows, regressions = compare(report, baseline, args.threshold)
+        report["comparison"] = {"baseline": args.baseline, "threshold": args.threshold, "rows": rows,
+                                "regressions": regressions}
+        for row in rows:
+            flag = "  REGRESSION" if row in regressions else ""
+            print(f"{row['decoder']:>22} {row['stage']:<13} {row['baseline_ms']:>10.2f} -> "
+                  f"{row['current_ms']:>10.2f} ms ({row['change'] * 100:+.1f}%){flag}", file=sys.stderr)
+        status = 1 if regressions else 0
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
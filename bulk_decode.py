@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from zxing_batch import IMAGE_EXTENSIONS
+
+# -----------------------------
+# FUNCTION: Walk the input tree
+# -----------------------------
+def iter_images(roots):
+    """Yield image paths under the given files/directories, lazily and in order."""
+    for root in roots:
+        if os.path.isfile(root):
+            yield root
+            continue
+        for dirpath, dirs, files in os.walk(root):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS or name.lower().endswith(".pdf"):
+                    yield os.path.join(dirpath, name)
+
+
+def load_checkpoint(output_path):
+    """Paths already decoded without error in an existing JSONL output (for --resume).
+
+    Records with ``error`` set (e.g. a worker or JVM failure) are retried;
+    the new record is appended after the old one, so the last record for a
+    path is the current one.
+    """
+    done = set()
+    if not output_path or not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if record.get("error") is None:
+                    done.add(record["path"])
+            except (ValueError, KeyError, AttributeError):
+                # Last line may be cut short if the previous run was killed
+                continue
+    return done
+
+
+def trim_partial_line(output_path, block=65536):
+    """Cut a last line left unfinished by a killed run, so appended records start on a new line.
+
+    The cut record was not in the checkpoint either, so it is decoded again.
+    """
+    if not output_path or not os.path.exists(output_path):
+        return
+    with open(output_path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            start = max(0, pos - block)
+            f.seek(start)
+            chunk = f.read(pos - start)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                cut = start + newline + 1
+                break
+            pos = start
+        else:
+            cut = 0
+        if cut < end:
+            f.truncate(cut)
+
+
+# -----------------------------
+# FUNCTION: Worker process side
+# -----------------------------
+def _init_worker():
+    # Each process gets its own warm JVM; one is enough per process
+    os.environ.setdefault("ZXING_WORKERS", "1")
+
+
+def decode_path(path, symbologies, dedupe=False):
+    """Decode one image in a worker process and return its JSON record.
+
+    Every page of a multi-page TIFF/PDF is decoded from memory; results
+    then carry the 1-based ``page`` they were found on. With
+    ``symbologies == ["auto"]`` the symbology classifier picks the backend
+    order and decoding stops at the first success. With ``dedupe`` images
+    that look like one this worker decoded recently only have their code
+    region decoded, and reuse its results once that confirms the payload
+    (see unified_decoder.decode).
+    """
+    from page_source import is_multipage, iter_file_pages
+    from unified_decoder import decode
+
+    decode_image = decode
+    if list(symbologies) == ["auto"]:
+        from symbology_classifier import dispatch
+
+        def decode_image(image, symbologies, cache=True, dedupe=False):
+            return dispatch(image, cache=cache, dedupe=dedupe)[0]
+
+    start = time.perf_counter()
+    record = {"path": path, "results": [], "error": None}
+    try:
+        if is_multipage(path):
+            for index, page in iter_file_pages(path):
+                for result in decode_image(page, symbologies, cache=False, dedupe=dedupe):
+                    result["page"] = index + 1
+                    record["results"].append(result)
+        else:
+            record["results"] = decode_image(path, symbologies, dedupe=dedupe)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return record
+
+
+# -----------------------------
+# FUNCTION: Bulk decode
+# -----------------------------
+def bulk_decode(roots, out, symbologies, workers=None, max_in_flight=None, skip=(), dedupe=False):
+    """Decode every image under ``roots`` across a process pool.
+
+    Records are written to ``out`` as JSON lines as soon as each image
+    finishes. At most ``max_in_flight`` images are queued at once, so memory
+    stays bounded however large the tree is. Returns a summary dict.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 2
+    summary = {"images": 0, "decoded": 0, "errors": 0, "skipped": 0, "near_duplicates": 0}
+    start = time.perf_counter()
+
+    def drain(pending, return_when):
+        done, pending = wait(pending, return_when=return_when)
+        for future in done:
+            record = future.result()
+            summary["images"] += 1
+            summary["decoded"] += bool(record["results"])
+            summary["errors"] += record["error"] is not None
+            summary["near_duplicates"] += any("near_duplicate" in result for result in record["results"])
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+        return pending
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        pending = set()
+        for path in iter_images(roots):
+            if path in skip:
+                summary["skipped"] += 1
+                continue
+            pending.add(executor.submit(decode_path, path, symbologies, dedupe))
+            if len(pending) >= max_in_flight:
+                pending = drain(pending, FIRST_COMPLETED)
+        while pending:
+            pending = drain(pending, FIRST_COMPLETED)
+
+    elapsed = time.perf_counter() - start
+    summary["seconds"] = round(elapsed, 3)
+    summary["images_per_sec"] = round(summary["images"] / elapsed, 2) if elapsed > 0 else 0.0
+    return summary
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main(argv=None):
+    from unified_decoder import SYMBOLOGIES
+
+    parser = argparse.ArgumentParser(description="Decode a directory tree of images into JSON lines.")
+    parser.add_argument("roots", nargs="+", help="directories and/or image files")
+    parser.add_argument("--output", help="JSONL file to write (default: stdout)")
+    parser.add_argument("--resume", action="store_true", help="skip images already in --output and append to it")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="images queued at once (default: 2 x workers)")
+    parser.add_argument("--symbologies", default=",".join(SYMBOLOGIES), help="comma-separated backends to run, or 'auto' to let the classifier order them")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="for an image whose code region looks like a recent one (per worker), decode only that "
+                             "region and reuse the results if it yields the same payloads; look-alike labels from "
+                             "one template still get a full decode")
+    args = parser.parse_args(argv)
+
+    if args.resume and not args.output:
+        parser.error("--resume needs --output")
+
+    skip = set()
+    if args.resume:
+        skip = load_checkpoint(args.output)
+        trim_partial_line(args.output)
+    symbologies = [s.strip() for s in args.symbologies.split(",") if s.strip()]
+    out = open(args.output, "a" if args.resume else "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        summary = bulk_decode(args.roots, out, symbologies, args.workers, args.max_in_flight, skip, args.dedupe)
+    finally:
+        if args.output:
+            out.close()
+
+    print(
+        f"Processed {summary['images']} images ({summary['decoded']} decoded, "
+        f"{summary['errors']} errors, {summary['skipped']} skipped, {summary['near_duplicates']} near-duplicates) "
+        f"in {summary['seconds']:.1f}s "
+        f"= {summary['images_per_sec']:.2f} images/sec",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,29 @@
 import cv2
-import numpy as np
 import subprocess
 import os
 import sys
 import shutil
+import threading
 from urllib.parse import quote
 
+from annotation_writer import annotate
+from decode_cache import cache_key, get_cache
+from decode_scheduler import rank, record_outcomes, run_backends, source_scope
+from jvm_launch import runner_command
+from localize import propose_regions
+from metrics import incr, span
+from zxing_batch import decode_found
+from zxing_container import get_container
+from zxing_worker import ZXingWorkerTimeout, decode_first, get_pool, image_request, spill_to_temp
+
 # Paths to required files
 javase_jar = "javase-3.5.0.jar"
 core_jar = "core-3.5.0.jar"
 jcommander_jar = "jcommander-1.82.jar"
 
+# Number of rotation candidates decoded at the same time
+rotation_workers = int(os.environ.get("ZXING_ROTATION_WORKERS", "4"))
+
 # Allow passing the image path via CLI, fallback to default
 datamatrix_image = sys.argv[1] if len(sys.argv) > 1 else "datamatrix_image.jpg"
 
@@ -19,6 +32,9 @@ image_abs = os.path.abspath(datamatrix_image)
 image_abs_forward = image_abs.replace("\\", "/")
 image_name = os.path.basename(datamatrix_image)
 
+# Rotation and backend statistics are kept per source folder (one per camera)
+scope = source_scope(datamatrix_image)
+
 # Validate required files
 for file in [javase_jar, core_jar, jcommander_jar]:
     if not os.path.exists(file):
@@ -29,104 +45,179 @@ if not os.path.exists(datamatrix_image):
     print(f"Warning: Image file {datamatrix_image} not found!")
     print("Please provide the correct image path.")
 
-def docker_command():
-    # Docker command to detect the Data Matrix code and get its position
-    return [
-        "docker", "run", "--rm",
-        "-v", f"{os.getcwd()}:/app",
-        "openjdk:17",
-        "java", "-cp",
-        f"/app/{javase_jar}:/app/{core_jar}:/app/{jcommander_jar}",
-        "com.google.zxing.client.j2se.CommandLineRunner",
-        f"/app/{image_name}"
-    ]
-
-def local_java_command():
-    # Local Java command (Windows uses ';' as classpath separator)
-    classpath = f"{javase_jar};{core_jar};{jcommander_jar}"
+def local_java_command(image_abs_forward=image_abs_forward):
     # Build a proper file URI to avoid ZXing URI parsing issues on Windows drive letters
     file_uri = f"file:///{quote(image_abs_forward)}"
-    return [
-        "java", "-cp", classpath,
-        "com.google.zxing.client.j2se.CommandLineRunner",
-        file_uri
-    ]
-
-def attempt_decode(current_image_path: str) -> str:
-    """Run ZXing through Docker or local Java for the given image path.
-    Returns the raw stdout from ZXing."""
-    global image_abs, image_abs_forward, image_name
-
-    # Update normalized paths for this candidate image
-    image_abs = os.path.abspath(current_image_path)
-    image_abs_forward = image_abs.replace("\\", "/")
-    image_name = os.path.basename(current_image_path)
-
-    out = ""
-    ran = False
-
-    if shutil.which("docker") is not None:
-        try:
-            result = subprocess.run(docker_command(), capture_output=True, text=True, check=True)
-            out = result.stdout.strip()
-            ran = True
-        except Exception as e:
-            print("Docker failed, attempting local Java fallback:", e)
+    # Platform classpath separator, startup flags and the CDS archive (see jvm_launch)
+    return runner_command([file_uri])
+
+def attempt_decode(candidate, cancel=None) -> str:
+    """Run ZXing through Docker or local Java for the given candidate.
+    The candidate is an image path or in-memory PNG bytes.
+    Returns the raw stdout from ZXing, or "" once ``cancel`` is set (another
+    candidate already won). Safe to call from several threads."""
+    if cancel is not None and cancel.is_set():
+        return ""
+
+    def container():
+        # One warm container (started on first use) serves every candidate
+        with span("zxing_attempt", path="container"):
+            return get_container().decode(candidate)
+
+    def pool():
+        # Warm JVM worker: the ZXing jars stay loaded between candidates
+        with span("zxing_attempt", path="pool"):
+            return get_pool().decode(image_request(candidate))
+
+    # Whichever backend has been working on this host goes first, and one
+    # whose breaker is open (e.g. a broken Docker daemon) is skipped
+    backends = [("container", container)] if shutil.which("docker") is not None else []
+    backends.append(("pool", pool))
+    # A timeout on this one image is not held against the backend
+    backend, out = run_backends(backends, scope, neutral=(ZXingWorkerTimeout,))
+
+    if backend is None:
+        if cancel is not None and cancel.is_set():
+            return ""
+        # CommandLineRunner only reads files: spill in-memory candidates into
+        # this run's private temp folder, never the shared working directory
+        current_image_path = spill_to_temp(candidate) if isinstance(candidate, bytes) else candidate
+        candidate_forward = os.path.abspath(current_image_path).replace("\\", "/")
 
-    if not ran:
         if shutil.which("java") is None:
             print("Neither Docker nor Java is available. Install Docker Desktop or a JDK (Java 17).")
             sys.exit(1)
         try:
-            result = subprocess.run(local_java_command(), capture_output=True, text=True, check=True)
+            with span("zxing_attempt", path="java"):
+                result = subprocess.run(local_java_command(candidate_forward), capture_output=True, text=True, check=True)
             out = result.stdout.strip()
         except subprocess.CalledProcessError as e:
+            incr("decode_failures", stage="java")
             print("Local Java decoding failed:")
             print(e.stderr)
             sys.exit(1)
 
     return out
 
-# Try original and rotated variants for robustness
-candidates = [datamatrix_image]
+# Same image bytes decoded before: reuse the result and skip ZXing entirely
+cache = get_cache()
+cache_hit = None
+if cache is not None and os.path.exists(datamatrix_image):
+    with open(datamatrix_image, "rb") as f:
+        decode_key = cache_key(f.read(), "zxing-rotations-roi")
+    cache_hit = cache.get(decode_key)
+
+# Try original and rotated variants for robustness.
+# Rotations stay in memory as lossless PNG bytes; nothing is written to the cwd.
+roi_candidates = []
+orientations = {"original": datamatrix_image}
+image_size = None
+region_offsets = {}
 try:
-    img = cv2.imread(datamatrix_image)
+    img = None
+    if cache_hit is None:
+        with span("imread"):
+            img = cv2.imread(datamatrix_image)
     if img is not None:
-        variants = {
-            "datamatrix_rot90.jpg": cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE),
-            "datamatrix_rot270.jpg": cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE),
-            "datamatrix_rot180.jpg": cv2.rotate(img, cv2.ROTATE_180),
-        }
-        for name, mat in variants.items():
-            cv2.imwrite(name, mat)
-            candidates.append(name)
+        image_size = img.shape[1], img.shape[0]
+
+        # Padded crops of likely code regions go first, so ZXing usually never
+        # sees the full frame; the original and its rotations stay as fallbacks
+        roi_pixels = 0
+        with span("localize"):
+            for i, (x, y, w, h) in enumerate(propose_regions(img)):
+                ok, buf = cv2.imencode(".png", img[y:y + h, x:x + w])
+                if ok:
+                    region_offsets[f"roi{i}"] = (x, y)
+                    roi_candidates.append((f"roi{i}", buf.tobytes()))
+                    roi_pixels += w * h
+        frame_pixels = image_size[0] * image_size[1]
+        print(f"Localization: {len(roi_candidates)} region(s), {roi_pixels:,} of {frame_pixels:,} pixels "
+              f"({100.0 * roi_pixels / frame_pixels:.1f}%) tried before the full frame")
+
+        with span("rotate_encode"):
+            variants = {
+                "rot90": cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE),
+                "rot270": cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE),
+                "rot180": cv2.rotate(img, cv2.ROTATE_180),
+            }
+            for name, mat in variants.items():
+                ok, buf = cv2.imencode(".png", mat)
+                if ok:
+                    orientations[name] = buf.tobytes()
 except Exception:
     pass
 
-output = ""
+# Orientations that won most often for this source go first
+orientation_order = rank(scope, "rotation", list(orientations))
+orientation_candidates = [(name, orientations[name]) for name in orientation_order]
+
+def to_original_coords(point, orientation):
+    """Map a point found in a rotated or cropped candidate back onto the original image."""
+    x, y = point
+    if orientation in region_offsets:
+        dx, dy = region_offsets[orientation]
+        return x + dx, y + dy
+    if image_size is None:
+        return x, y
+    w, h = image_size
+    if orientation == "rot90":
+        return y, h - 1 - x
+    if orientation == "rot270":
+        return w - 1 - y, x
+    if orientation == "rot180":
+        return w - 1 - x, h - 1 - y
+    return x, y
+
+if cache_hit is not None:
+    orientation, output, image_size = cache_hit["orientation"], cache_hit["output"], cache_hit["image_size"]
+    region_offsets = cache_hit["region_offsets"]
+else:
+    # Region crops race first; the full frame and its rotations only start
+    # when no crop decodes. Within a race the first real result wins.
+    orientation, output = None, ""
+    outcomes = []
+    for group in (roi_candidates, orientation_candidates):
+        if not group:
+            continue
+        cancel = threading.Event()
+        orientation, output = decode_first(group, lambda candidate, cancel=cancel: attempt_decode(candidate, cancel),
+                                           decode_found, rotation_workers, cancel, outcomes=outcomes)
+        if orientation is not None:
+            break
+    # Only candidates that finished count. A region crop that decodes is a
+    # win for the original orientation; a crop that misses says nothing about it
+    record_outcomes(scope, "rotation", [
+        ("original" if label in region_offsets else label, won, elapsed_ms)
+        for label, won, elapsed_ms in outcomes if won or label not in region_offsets
+    ])
+    # Misses are not cached: a later run with a working backend or more
+    # candidates should get to try this image again
+    if cache is not None and orientation is not None:
+        cache.put(decode_key, {"orientation": orientation, "output": output, "image_size": image_size,
+                               "region_offsets": region_offsets})
 decoded_text = ""
-for candidate in candidates:
-    output = attempt_decode(candidate)
-    if "No barcode found" not in output:
-        # Extract the decoded text from ZXing output
-        lines = output.splitlines()
-        for line in lines:
-            if line.strip() and not line.startswith("Raw") and not line.startswith("  Point") and not line.startswith("Parsed") and not line.startswith("Found"):
-                # The decoded content is usually after the "Raw" line or the main line
-                if decoded_text == "":
-                    decoded_text = line.strip()
-                elif line.strip() and not line.strip().startswith("Raw"):
-                    # Sometimes the decoded text is on a separate line
-                    potential_text = line.strip()
-                    if len(potential_text) > 0 and not potential_text.startswith("("):
-                        decoded_text = potential_text
-        break
+if orientation is not None:
+    # Extract the decoded text from ZXing output
+    lines = output.splitlines()
+    for line in lines:
+        if line.strip() and not line.startswith("Raw") and not line.startswith("  Point") and not line.startswith("Parsed") and not line.startswith("Found"):
+            # The decoded content is usually after the "Raw" line or the main line
+            if decoded_text == "":
+                decoded_text = line.strip()
+            elif line.strip() and not line.strip().startswith("Raw"):
+                # Sometimes the decoded text is on a separate line
+                potential_text = line.strip()
+                if len(potential_text) > 0 and not potential_text.startswith("("):
+                    decoded_text = potential_text
 
 print("=" * 60)
 print("Data Matrix Decoder Output:")
 print("=" * 60)
 print(output)
 print("=" * 60)
+if orientation is not None:
+    print(f"Orientation: {orientation}")
 
 if decoded_text:
     print(f"\nDecoded Text: {decoded_text}")
@@ -154,7 +245,8 @@ points = []
 for line in output.splitlines():
     if line.startswith("  Point"):
         parts = line.split(":")[1].strip().replace("(", "").replace(")", "").split(",")
-        points.append((int(float(parts[0])), int(float(parts[1]))))
+        point = (int(float(parts[0])), int(float(parts[1])))
+        points.append(to_original_coords(point, orientation))
 
 # If points are found, draw a bounding polygon
 if len(points) >= 4:
@@ -163,29 +255,9 @@ if len(points) >= 4:
     if image is None:
         print("Error: Unable to read the image!")
     else:
-        # Draw a polygon connecting the points
-        points_array = np.array(points, dtype=np.int32).reshape((-1, 1, 2))
+        # Polygon through the points; the PNG is written in the background and
+        # the window is skipped when headless
         print(f"\nDrawing polygon with points: {points}")
-
-        cv2.polylines(image, [points_array], isClosed=True, color=(0, 255, 0), thickness=2)
-
-        # Save and display the annotated image
-        annotated_image_path = "annotated_datamatrix.png"
-        cv2.imwrite(annotated_image_path, image)
-        print(f"Annotated image saved as {annotated_image_path}")
-
-        # Display the image
-        cv2.imshow("Detected Data Matrix Code", image)
-        print("Press any key to close the window.")
-        cv2.waitKey(0)
-        cv2.destroyAllWindows()
+        annotate(image, [(points, None)], "annotated_datamatrix.png", "Detected Data Matrix Code")
 else:
     print("\nNo bounding box points detected.")
-
-# Clean up rotation variants
-for variant in ["datamatrix_rot90.jpg", "datamatrix_rot270.jpg", "datamatrix_rot180.jpg"]:
-    if os.path.exists(variant):
-        try:
-            os.remove(variant)
-        except:
-            pass
\ No newline at end of file
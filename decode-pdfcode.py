@@ -1,51 +1,71 @@
-from pdf417decoder import PDF417Decoder
-from PIL import Image
-import re
-
-def decode_pdf417(image_path):
-    # Open the image
-    image = Image.open(image_path)
-    decoder = PDF417Decoder(image)
-    
-    # Decode barcodes
-    barcode_count = decoder.decode()
-    if barcode_count > 0:
-        for i, raw_bytes in enumerate(decoder.barcodes_data):
-            # Decode raw bytes
-            text = raw_bytes.decode('utf-8', errors='ignore')
-            
-            print(f"\n--- RAW PDF417 Barcode {i+1} ---")
-            print(text)
-            
-            # --- Clean the text ---
-            clean_text = re.sub(r'[^A-Za-z0-9\s]', '', text)        # Remove symbols
-            clean_text = re.sub(r'[A-Za-z]{20,}', '', clean_text)   # Remove long junk sequences
-            clean_text = re.sub(r'\s+', ' ', clean_text).strip()    # Normalize whitespace
-            
-            print("\n--- CLEANED TEXT ---")
-            print(clean_text)
-
-            # --- Extract likely fields ---
-            name_match = re.search(r'\b([A-Z]{3,}[A-Z]*[a-z]+)\b', clean_text)
-            id_match = re.search(r'\b\d{7,}\b', clean_text)
-            year_match = re.search(r'\b(19|20)\d{2}\b', clean_text)
-            date_match = re.search(r'\b\d{6}\b', clean_text)
-
-            print("\n--- EXTRACTED DATA ---")
-            if id_match:
-                print("ID Number:", id_match.group(0))
-            if year_match:
-                print("Birth Year:", year_match.group(0))
-            if name_match:
-                print("Name:", name_match.group(1))
-            if date_match:
-                print("Possible Date (YYMMDD or similar):", date_match.group(0))
-        return True
-    else:
-        print("No PDF417 barcodes detected.")
-        return False
+import os
+import sys
+
+from localize import format_report
+from page_source import is_multipage, page_label, stream_pages
+from pdf417_tools import decode_batch, decode_file, decode_image
+
+def decode_pdf417(image_path, stats=None):
+    """Structured records for every PDF417 barcode in the image.
+
+    Each record has ``raw`` (decoded text), ``clean`` (symbols and junk
+    removed) and ``fields`` (id_number, birth_year, name, date; None when
+    absent). Preprocessing, localization and caching are in pdf417_tools.
+    """
+    return decode_file(image_path, stats)
+
+def print_records(records):
+    for i, record in enumerate(records):
+        print(f"\n--- RAW PDF417 Barcode {i+1} ---")
+        print(record["raw"])
+
+        print("\n--- CLEANED TEXT ---")
+        print(record["clean"])
+
+        fields = record["fields"]
+        print("\n--- EXTRACTED DATA ---")
+        if fields["id_number"]:
+            print("ID Number:", fields["id_number"])
+        if fields["birth_year"]:
+            print("Birth Year:", fields["birth_year"])
+        if fields["name"]:
+            print("Name:", fields["name"])
+        if fields["date"]:
+            print("Possible Date (YYMMDD or similar):", fields["date"])
 
 
 if __name__ == "__main__":
-    image_path = "./images/encoded-image.jpg"  # replace with your image path
-    decode_pdf417(image_path)
+    image_paths = sys.argv[1:] or ["./images/encoded-image.jpg"]
+
+    # Multi-page TIFF/PDF scans and globs: pages are decoded straight from
+    # memory as they are read, nothing is exported to disk
+    if any(is_multipage(path) or not os.path.exists(path) for path in image_paths):
+        for source, index, page in stream_pages(image_paths):
+            print(f"\n===== {page_label(source, index)} =====")
+            records = decode_image(page, page_label(source, index)) if page is not None else []
+            if records:
+                print_records(records)
+            else:
+                print("No PDF417 barcodes detected.")
+        sys.exit(0)
+
+    if len(image_paths) == 1:
+        stats = {}
+        records = decode_pdf417(image_paths[0], stats)
+        if "localization" in stats:
+            print(format_report(stats["localization"]))
+        if records:
+            print_records(records)
+        else:
+            print("No PDF417 barcodes detected.")
+        sys.exit(0 if records else 1)
+
+    # Batch: images are decoded in parallel worker processes
+    for path, records in zip(image_paths, decode_batch(image_paths)):
+        print(f"\n===== {path} =====")
+        if records and "error" in records[0]:
+            print(f"Error: {records[0]['error']}")
+        elif records:
+            print_records(records)
+        else:
+            print("No PDF417 barcodes detected.")
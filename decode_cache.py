@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import incr
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+DEFAULT_CACHE_PATH = os.environ.get(
+    "DECODE_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "code-decode", "decode_cache.sqlite"),
+)
+DEFAULT_MEMORY_ITEMS = int(os.environ.get("DECODE_CACHE_MEMORY_ITEMS", "1024"))
+DEFAULT_MAX_DISK_BYTES = int(os.environ.get("DECODE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Set DECODE_CACHE=0 to turn caching off everywhere
+CACHE_ENABLED = os.environ.get("DECODE_CACHE", "1") != "0"
+
+
+def cache_key(image_bytes, decoder, options=None):
+    """Content hash of the image bytes plus the decoder name and its options."""
+    h = hashlib.sha256()
+    h.update(image_bytes)
+    h.update(b"\0" + decoder.encode("utf-8") + b"\0")
+    h.update(json.dumps(options or {}, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+# -----------------------------
+# CLASS: Two-tier cache
+# -----------------------------
+class DecodeCache:
+    """Decode results keyed by content hash: an LRU dict in front of SQLite.
+
+    Values are anything JSON-serialisable except None, which get() uses to
+    mean "not cached". Both tiers store the JSON text, so callers can modify
+    what they get back. The memory tier holds at most ``memory_items``
+    entries; the SQLite tier is trimmed, least recently used first, once its
+    payloads exceed ``max_disk_bytes``. Pass ``path=None`` for a memory-only
+    cache.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, memory_items=DEFAULT_MEMORY_ITEMS, max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.path = path
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "puts": 0, "evictions": 0}
+        self._db = None
+        self._disk_bytes = 0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS decode_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS decode_cache_access ON decode_cache(last_access)")
+            self._db.commit()
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM decode_cache").fetchone()[0]
+
+    def _remember(self, key, data):
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Cached value for ``key`` or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                incr("cache_lookups", result="memory_hit")
+                return json.loads(self._memory[key])
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM decode_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE decode_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    self._remember(key, row[0])
+                    self.stats["disk_hits"] += 1
+                    incr("cache_lookups", result="disk_hit")
+                    return json.loads(row[0])
+            self.stats["misses"] += 1
+            incr("cache_lookups", result="miss")
+            return None
+
+    def put(self, key, value):
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, data)
+            self.stats["puts"] += 1
+            if self._db is None:
+                return
+            old = self._db.execute("SELECT size FROM decode_cache WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO decode_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time()),
+            )
+            self._disk_bytes += len(data) - (old[0] if old else 0)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        # Drop least recently used rows until the store fits again
+        while self._disk_bytes > self.max_disk_bytes:
+            rows = self._db.execute(
+                "SELECT key, size FROM decode_cache ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                break
+            for key, size in rows:
+                self._db.execute("DELETE FROM decode_cache WHERE key = ?", (key,))
+                self._memory.pop(key, None)
+                self._disk_bytes -= size
+                self.stats["evictions"] += 1
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
+
+    def get_or_compute(self, image_bytes, decoder, compute, options=None):
+        """Return the cached result for this image/decoder/options or compute and store it."""
+        key = cache_key(image_bytes, decoder, options)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM decode_cache")
+                self._db.commit()
+                self._disk_bytes = 0
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Shared process-wide cache, or None when DECODE_CACHE=0."""
+    global _default_cache
+    if not CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = DecodeCache()
+        return _default_cache
+
+
+def cached(image_bytes, decoder, compute, options=None):
+    """get_or_compute on the shared cache; just compute() when caching is off."""
+    cache = get_cache()
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(image_bytes, decoder, compute, options)
+
+
+if __name__ == "__main__":
+    cache = get_cache()
+    if cache is None:
+        print("Decode cache is disabled (DECODE_CACHE=0).")
+    else:
+        count = cache._db.execute("SELECT COUNT(*) FROM decode_cache").fetchone()[0]
+        print(f"Cache: {cache.path}")
+        print(f"Entries: {count}, size: {cache._disk_bytes} bytes (limit {cache.max_disk_bytes})")
@@ -0,0 +1,301 @@
+import atexit
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from metrics import incr
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+DEFAULT_SCHEDULER_PATH = os.environ.get(
+    "DECODE_SCHEDULER_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "code-decode", "scheduler.sqlite"),
+)
+# Set DECODE_SCHEDULER=0 to keep the fixed orders everywhere
+SCHEDULER_ENABLED = os.environ.get("DECODE_SCHEDULER", "1") != "0"
+# Older outcomes weigh less: each new one multiplies the running counts by this
+DECAY = float(os.environ.get("DECODE_SCHEDULER_DECAY", "0.98"))
+# Consecutive failures that open a backend's breaker, and how long it stays open
+BREAKER_FAILURES = int(os.environ.get("DECODE_BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN = float(os.environ.get("DECODE_BREAKER_COOLDOWN", "300"))
+# Seconds between writes to SQLite; outcomes in between are written in one transaction
+FLUSH_INTERVAL = float(os.environ.get("DECODE_SCHEDULER_FLUSH_S", "5"))
+
+# Statistics recorded under every scope as well, used when a scope is new
+GLOBAL_SCOPE = "*"
+
+
+def source_scope(path=None):
+    """Scope the statistics are kept under: DECODE_SOURCE, else the image's folder (one per camera)."""
+    scope = os.environ.get("DECODE_SOURCE")
+    if scope:
+        return scope
+    if path is None:
+        return GLOBAL_SCOPE
+    return os.path.dirname(os.path.abspath(path))
+
+
+# -----------------------------
+# CLASS: Scheduler
+# -----------------------------
+class DecodeScheduler:
+    """Learns which rotation and backend win, per scope, and orders future attempts.
+
+    Each (scope, kind, option) keeps decayed attempt and success counts and
+    a moving average latency; ``rank()`` puts the likeliest winner first
+    (ties go to the faster option, then to the caller's order). Each backend
+    also has a circuit breaker: ``failures`` consecutive failures open it
+    for ``cooldown`` seconds, after which a single trial call is let through
+    until it reports back. Everything is kept in SQLite so short-lived
+    scripts learn across runs; changes are written at most every
+    ``flush_interval`` seconds, on flush() and on close(). Pass ``path=None``
+    to keep it in memory only.
+    """
+
+    def __init__(self, path=DEFAULT_SCHEDULER_PATH, decay=DECAY, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN,
+                 flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.decay = decay
+        self.failures = failures
+        self.cooldown = cooldown
+        self.flush_interval = flush_interval
+        self._stats = {}
+        self._breakers = {}
+        self._trials = set()
+        self._dirty_stats = set()
+        self._dirty_breakers = set()
+        self._last_write = time.monotonic()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS option_stats ("
+                " scope TEXT NOT NULL, kind TEXT NOT NULL, option TEXT NOT NULL,"
+                " attempts REAL NOT NULL, successes REAL NOT NULL, latency_ms REAL,"
+                " PRIMARY KEY (scope, kind, option))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS breakers ("
+                " backend TEXT PRIMARY KEY, failures INTEGER NOT NULL, open_until REAL NOT NULL)"
+            )
+            self._db.commit()
+            for scope, kind, option, attempts, successes, latency in self._db.execute("SELECT * FROM option_stats"):
+                self._stats[(scope, kind, option)] = [attempts, successes, latency]
+            for backend, failures, open_until in self._db.execute("SELECT * FROM breakers"):
+                self._breakers[backend] = [failures, open_until]
+
+    # Persistence ----------------------------------------------------------
+    def _write(self, force=False):
+        # Caller holds the lock. One short transaction for everything changed
+        # since the last write, so the decode path rarely touches the disk
+        if self._db is None or not (self._dirty_stats or self._dirty_breakers):
+            return
+        if not force and time.monotonic() - self._last_write < self.flush_interval:
+            return
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO option_stats VALUES (?, ?, ?, ?, ?, ?)",
+                                 [(*key, *self._stats[key]) for key in self._dirty_stats])
+            self._db.executemany("INSERT OR REPLACE INTO breakers VALUES (?, ?, ?)",
+                                 [(backend, *self._breakers[backend]) for backend in self._dirty_breakers])
+        self._dirty_stats.clear()
+        self._dirty_breakers.clear()
+        self._last_write = time.monotonic()
+
+    def flush(self):
+        """Write pending changes to SQLite now."""
+        with self._lock:
+            self._write(force=True)
+
+    # Outcomes ------------------------------------------------------------
+    def _update(self, key, success, latency_ms):
+        entry = self._stats.setdefault(key, [0.0, 0.0, None])
+        entry[0] = entry[0] * self.decay + 1.0
+        entry[1] = entry[1] * self.decay + (1.0 if success else 0.0)
+        if latency_ms is not None:
+            entry[2] = latency_ms if entry[2] is None else 0.8 * entry[2] + 0.2 * latency_ms
+        self._dirty_stats.add(key)
+
+    def record(self, scope, kind, option, success, latency_ms=None):
+        """Record one outcome of ``option`` (e.g. kind "rotation", option "rot90")."""
+        with self._lock:
+            self._update((scope, kind, option), success, latency_ms)
+            if scope != GLOBAL_SCOPE:
+                self._update((GLOBAL_SCOPE, kind, option), success, latency_ms)
+            self._write()
+
+    def _score(self, scope, kind, option):
+        entry = self._stats.get((scope, kind, option)) or self._stats.get((GLOBAL_SCOPE, kind, option))
+        if entry is None:
+            # Unseen options rank as a coin flip, at unknown speed
+            return 0.5, float("inf")
+        attempts, successes, latency = entry
+        return (successes + 1.0) / (attempts + 2.0), latency if latency is not None else float("inf")
+
+    def rank(self, scope, kind, options):
+        """``options`` reordered likeliest winner first (stable for equal scores)."""
+        with self._lock:
+            scores = {option: self._score(scope, kind, option) for option in options}
+        return sorted(options, key=lambda option: (-scores[option][0], scores[option][1]))
+
+    # Circuit breaker -------------------------------------------------------
+    def allow(self, backend):
+        """False while ``backend``'s breaker is open.
+
+        Once the cooldown has passed, True for exactly one caller (the trial
+        call) until it reports back through record_backend() or end_trial().
+        """
+        with self._lock:
+            state = self._breakers.get(backend)
+            if state is None or state[0] < self.failures:
+                return True
+            if time.time() < state[1] or backend in self._trials:
+                return False
+            self._trials.add(backend)
+            return True
+
+    def end_trial(self, backend):
+        """Let the next caller try ``backend`` again (its trial call ended without a verdict)."""
+        with self._lock:
+            self._trials.discard(backend)
+
+    def record_backend(self, backend, success, latency_ms=None, scope=GLOBAL_SCOPE):
+        """Record a backend call; ``failures`` failures in a row open its breaker."""
+        self.record(scope, "backend", backend, success, latency_ms)
+        with self._lock:
+            self._trials.discard(backend)
+            state = self._breakers.setdefault(backend, [0, 0.0])
+            if success:
+                if state[0]:
+                    state[0], state[1] = 0, 0.0
+                    self._dirty_breakers.add(backend)
+            else:
+                state[0] += 1
+                self._dirty_breakers.add(backend)
+                if state[0] >= self.failures:
+                    # Also re-opens at once when the trial call after a cooldown fails
+                    state[1] = time.time() + self.cooldown
+                    incr("breaker_open", backend=backend)
+                    print(f"Warning: {backend} failed {state[0]} times in a row, "
+                          f"skipping it for {self.cooldown:.0f}s", file=sys.stderr)
+                    # Written at once so other processes starting now skip it too
+                    self._write(force=True)
+            self._write()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "options": [
+                    {"scope": scope, "kind": kind, "option": option, "attempts": round(entry[0], 2),
+                     "successes": round(entry[1], 2), "latency_ms": entry[2]}
+                    for (scope, kind, option), entry in sorted(self._stats.items())
+                ],
+                "breakers": {backend: {"failures": state[0], "open_until": state[1]}
+                             for backend, state in self._breakers.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._breakers.clear()
+            self._trials.clear()
+            self._dirty_stats.clear()
+            self._dirty_breakers.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM option_stats")
+                self._db.execute("DELETE FROM breakers")
+                self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._write(force=True)
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Shared process-wide scheduler, or None when DECODE_SCHEDULER=0."""
+    global _default_scheduler
+    if not SCHEDULER_ENABLED:
+        return None
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = DecodeScheduler()
+            # Outcomes since the last periodic write are not lost at exit
+            atexit.register(_default_scheduler.close)
+        return _default_scheduler
+
+
+# -----------------------------
+# FUNCTION: Ordered attempts
+# -----------------------------
+def rank(scope, kind, options):
+    """Scheduler order for ``options``, or the given order when scheduling is off."""
+    scheduler = get_scheduler()
+    return scheduler.rank(scope, kind, list(options)) if scheduler is not None else list(options)
+
+
+def record_outcomes(scope, kind, outcomes):
+    """Record (option, succeeded, latency_ms) outcomes of candidates that actually finished."""
+    scheduler = get_scheduler()
+    if scheduler is None:
+        return
+    for option, success, latency_ms in outcomes:
+        scheduler.record(scope, kind, option, success, latency_ms)
+
+
+def run_backends(backends, scope=GLOBAL_SCOPE, errors=(Exception,), neutral=()):
+    """Call (name, function) backends, most reliable first, until one returns.
+
+    Backends whose breaker is open are skipped, and ``errors`` raised by a
+    backend move on to the next one. Those that are also ``neutral`` (e.g. a
+    ZXingWorkerTimeout on one hard image) say nothing about the backend and
+    do not count against its breaker. Returns (name, result), or (None, None)
+    when every backend failed or was skipped.
+    """
+    scheduler = get_scheduler()
+    functions = dict(backends)
+    names = scheduler.rank(scope, "backend", list(functions)) if scheduler is not None else list(functions)
+    for name in names:
+        if scheduler is not None and not scheduler.allow(name):
+            incr("breaker_skip", backend=name)
+            continue
+        start = time.perf_counter()
+        try:
+            result = functions[name]()
+        except errors as e:
+            if scheduler is not None and not isinstance(e, neutral):
+                scheduler.record_backend(name, False, scope=scope)
+            incr("fallback", source=name)
+            print(f"Warning: {name} backend failed, trying the next one ({e})", file=sys.stderr)
+            continue
+        else:
+            if scheduler is not None:
+                scheduler.record_backend(name, True, (time.perf_counter() - start) * 1000, scope)
+            return name, result
+        finally:
+            # A trial call that ended without a verdict lets the next caller try
+            if scheduler is not None:
+                scheduler.end_trial(name)
+    return None, None
+
+
+if __name__ == "__main__":
+    import json
+
+    scheduler = DecodeScheduler()
+    if sys.argv[1:] == ["--reset"]:
+        scheduler.reset()
+        print("Scheduler statistics cleared.")
+    else:
+        print(json.dumps(scheduler.snapshot(), indent=2))
@@ -0,0 +1,435 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
+
+from decode_cache import cache_key, get_cache
+from metrics import prometheus_text
+from unified_decoder import BACKENDS, CACHE_NAMESPACE, SYMBOLOGIES, decode, make_result
+from zxing_batch import decode_chunk, parse_output
+from zxing_worker import ZXingWorkerError, get_pool, image_request, spill_to_temp
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Requests waiting for a decoder; beyond this new requests get a 503
+DEFAULT_QUEUE_SIZE = 64
+# ZXing requests are gathered for at most this long, up to this many per batch
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_BATCH_WAIT_MS = 5.0
+MAX_BODY_BYTES = 32 * 1024 * 1024
+# Latency samples kept for the percentiles
+LATENCY_WINDOW = 10000
+
+
+class ServiceOverloaded(RuntimeError):
+    """The request queue is full; the client should retry later."""
+
+
+def percentiles(values, points=(50, 90, 95, 99)):
+    if not values:
+        return {}
+    ordered = sorted(values)
+    stats = {"count": len(ordered), "mean": round(sum(ordered) / len(ordered), 2)}
+    for p in points:
+        stats[f"p{p}"] = round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 2)
+    return stats
+
+
+# -----------------------------
+# FUNCTION: One ZXing micro-batch
+# -----------------------------
+def _zxing_results(record):
+    if not record["found"]:
+        return []
+    return [make_result(record["raw"], record["format"], record["points"] or None, "zxing")]
+
+
+def decode_zxing_batch(images, fanout, cache=None):
+    """Decode a batch of encoded images with ZXing; returns one result list per image.
+
+    Cached images are answered directly. The rest go to the persistent
+    worker pool through ``fanout`` (a thread pool as large as the worker
+    pool). Images the pool fails on (timeout, crash, no pool at all) are
+    decoded together by one CommandLineRunner call, so a burst costs at
+    most one JVM start instead of one per request.
+    """
+    keys = [cache_key(hashlib.sha256(data).digest(), f"{CACHE_NAMESPACE}:zxing") if cache else None for data in images]
+    results = [cache.get(key) if cache else None for key in keys]
+    todo = [i for i, hit in enumerate(results) if hit is None]
+    for i, hit in enumerate(results):
+        if hit is not None:
+            results[i] = [dict(result, cached=True) for result in hit]
+    if not todo:
+        return results
+
+    pool = get_pool()
+
+    def decode_one(i):
+        # One image failing (timeout, crash) must not throw away the others
+        try:
+            return parse_output(pool.decode(image_request(images[i])))
+        except ZXingWorkerError:
+            return None
+
+    records = list(fanout.map(decode_one, todo))
+    failed = [n for n, record in enumerate(records) if record is None]
+    if failed:
+        # Only the images the pool could not decode go to one CommandLineRunner call
+        paths = [spill_to_temp(images[todo[n]]) for n in failed]
+        try:
+            fallback = decode_chunk(paths)
+        finally:
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        errors = [record["error"] for record in fallback if record.get("error")]
+        if errors and len(failed) == len(todo) and len(errors) == len(fallback):
+            raise ZXingWorkerError(errors[0])
+        for n, record in zip(failed, fallback):
+            records[n] = record
+
+    for i, record in zip(todo, records):
+        results[i] = _zxing_results(record)
+        if cache and not record.get("error"):
+            cache.put(keys[i], results[i])
+    return results
+
+
+# -----------------------------
+# CLASS: Queue, batcher and executors
+# -----------------------------
+class DecodeService:
+    """Asyncio front end for the decoders, usable in-process or over HTTP.
+
+    ``submit()`` puts a request on a bounded queue and raises
+    ServiceOverloaded at once when it is full, so bursts are shed instead of
+    piling up. ``threads`` consumers run the blocking QR, pyzbar and PDF417
+    backends (unified_decoder.decode) in a thread pool. ZXing requests are
+    micro-batched: they wait up to ``batch_wait_ms`` for up to
+    ``batch_size`` companions and each batch is decoded by one executor
+    call. ZXing always runs after the other backends.
+    """
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, threads=None, batch_size=DEFAULT_BATCH_SIZE,
+                 batch_wait_ms=DEFAULT_BATCH_WAIT_MS, cache=True):
+        self.queue_size = queue_size
+        self.threads = threads or os.cpu_count() or 1
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.cache = get_cache() if cache is True else cache
+        self.counters = {"accepted": 0, "rejected": 0, "completed": 0, "errors": 0, "zxing_batches": 0, "zxing_images": 0}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.queue_waits = deque(maxlen=LATENCY_WINDOW)
+        self._queue = None
+        self._zxing_queue = None
+        self._tasks = []
+        self._batches = set()
+        self._executor = None
+        self._zxing_executor = None
+        self._fanout = None
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._zxing_queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="decode")
+        zxing_workers = int(os.environ.get("ZXING_WORKERS", "4"))
+        self._zxing_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="zxing-batch")
+        self._fanout = ThreadPoolExecutor(max_workers=zxing_workers, thread_name_prefix="zxing")
+        self._tasks = [asyncio.ensure_future(self._consume()) for _ in range(self.threads)]
+        self._tasks.append(asyncio.ensure_future(self._batch_zxing()))
+
+    async def stop(self):
+        for task in list(self._tasks) + list(self._batches):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._batches, return_exceptions=True)
+        self._tasks = []
+        for executor in (self._executor, self._zxing_executor, self._fanout):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    async def submit(self, data, symbologies=SYMBOLOGIES, stop_at_first=False):
+        """Decode encoded image bytes; returns the list of result dicts."""
+        if self._queue is None:
+            raise RuntimeError("DecodeService is not started")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((data, tuple(symbologies), stop_at_first, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            raise ServiceOverloaded(f"decode queue full ({self.queue_size} waiting)")
+        self.counters["accepted"] += 1
+        return await future
+
+    async def _consume(self):
+        while True:
+            data, symbologies, stop_at_first, future, queued_at = await self._queue.get()
+            self.queue_waits.append((time.perf_counter() - queued_at) * 1000)
+            try:
+                if future.cancelled():
+                    continue
+                results = await self._decode(data, symbologies, stop_at_first)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.counters["errors"] += 1
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self.counters["completed"] += 1
+                self.latencies.append((time.perf_counter() - queued_at) * 1000)
+                if not future.done():
+                    future.set_result(results)
+            finally:
+                self._queue.task_done()
+
+    async def _decode(self, data, symbologies, stop_at_first):
+        loop = asyncio.get_running_loop()
+        others = [name for name in symbologies if name != "zxing"]
+        results = []
+        if others:
+            results = await loop.run_in_executor(
+                self._executor, partial(decode, data, others, stop_at_first=stop_at_first, cache=self.cache or False)
+            )
+        if "zxing" in symbologies and not (results and stop_at_first):
+            future = loop.create_future()
+            await self._zxing_queue.put((data, future))
+            results.extend(await future)
+        return results
+
+    async def _batch_zxing(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._zxing_queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._zxing_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Batches run concurrently; the next one can form while this one decodes
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch):
+        self.counters["zxing_batches"] += 1
+        self.counters["zxing_images"] += len(batch)
+        images = [data for data, _ in batch]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._zxing_executor, decode_zxing_batch, images, self._fanout, self.cache
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), found in zip(batch, results):
+            if not future.done():
+                future.set_result(found)
+
+    def stats(self):
+        batches = self.counters["zxing_batches"]
+        return dict(
+            self.counters,
+            queued=self._queue.qsize() if self._queue is not None else 0,
+            queue_size=self.queue_size,
+            zxing_mean_batch=round(self.counters["zxing_images"] / batches, 2) if batches else 0.0,
+            latency_ms=percentiles(self.latencies),
+            queue_wait_ms=percentiles(self.queue_waits),
+        )
+
+    # -----------------------------
+    # HTTP
+    # -----------------------------
+    async def handle_connection(self, reader, writer):
+        """Minimal HTTP/1.1 with keep-alive: POST /decode, GET /stats, /metrics, /health."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, _ = line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "image too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload, extra = await self._route(method, target, body)
+                close = headers.get("connection", "").lower() == "close"
+                await self._respond(writer, status, payload, extra, close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, target, body):
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        if method == "GET" and url.path == "/health":
+            return 200, {"status": "ok"}, {}
+        if method == "GET" and url.path == "/stats":
+            return 200, self.stats(), {}
+        if method == "GET" and url.path == "/metrics":
+            # Prometheus text snapshot (filled when DECODE_METRICS=1)
+            return 200, prometheus_text(), {}
+        if url.path != "/decode":
+            return 404, {"error": f"no route for {url.path}"}, {}
+        if method != "POST":
+            return 405, {"error": "use POST with the image as the body"}, {"Allow": "POST"}
+        if not body:
+            return 400, {"error": "empty body"}, {}
+
+        symbologies = [s for value in params.get("symbologies", []) for s in value.split(",") if s] or list(SYMBOLOGIES)
+        unknown = [name for name in symbologies if name not in BACKENDS]
+        if unknown:
+            return 400, {"error": f"unknown symbologies: {', '.join(unknown)}"}, {}
+        stop_at_first = params.get("stop_at_first", ["0"])[-1].lower() in ("1", "true", "yes")
+
+        start = time.perf_counter()
+        try:
+            results = await self.submit(body, symbologies, stop_at_first)
+        except ServiceOverloaded as e:
+            return 503, {"error": str(e)}, {"Retry-After": "1"}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}, {}
+        return 200, {"results": results, "elapsed_ms": round((time.perf_counter() - start) * 1000, 3)}, {}
+
+    async def _respond(self, writer, status, payload, extra=None, close=False):
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                   413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json"
+        head = [f"HTTP/1.1 {status} {reasons.get(status, '')}", f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}", f"Connection: {'close' if close else 'keep-alive'}"]
+        head += [f"{name}: {value}" for name, value in (extra or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+    """Run ``service`` on a TCP port (or a Unix socket) until cancelled."""
+    await service.start()
+    if unix_path:
+        server = await asyncio.start_unix_server(service.handle_connection, path=unix_path)
+        where = unix_path
+    else:
+        server = await asyncio.start_server(service.handle_connection, host, port)
+        where = f"http://{host}:{port}"
+    print(f"Decode service listening on {where}", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+# -----------------------------
+# CLIENT
+# -----------------------------
+async def request(method, path, body=b"", host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+    """One HTTP request to a running service; returns (status, decoded JSON)."""
+    if unix_path:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        head = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await reader.readexactly(length))
+    finally:
+        writer.close()
+
+
+async def run_client(paths, symbologies=None, repeat=1, concurrency=8, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                     unix_path=None):
+    """Send every image ``repeat`` times with bounded concurrency, then fetch /stats."""
+    query = f"/decode?symbologies={','.join(symbologies)}" if symbologies else "/decode"
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(path):
+        with open(path, "rb") as f:
+            data = f.read()
+        async with gate:
+            status, payload = await request("POST", query, data, host, port, unix_path)
+        print(json.dumps({"path": path, "status": status, **payload}, ensure_ascii=False))
+
+    await asyncio.gather(*(one(path) for path in list(paths) * repeat))
+    _, stats = await request("GET", "/stats", host=host, port=port, unix_path=unix_path)
+    print(json.dumps(stats), file=sys.stderr)
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Asyncio decode service with ZXing micro-batching.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="listen on / connect to this Unix socket instead of TCP")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    server = sub.add_parser("serve", help="run the service")
+    server.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE)
+    server.add_argument("--threads", type=int, default=None, help="decoder threads (default: all cores)")
+    server.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    server.add_argument("--batch-wait-ms", type=float, default=DEFAULT_BATCH_WAIT_MS)
+
+    client = sub.add_parser("client", help="send images to a running service")
+    client.add_argument("images", nargs="+")
+    client.add_argument("--symbologies", default=None, help="comma-separated backends (default: all)")
+    client.add_argument("--repeat", type=int, default=1, help="send each image this many times")
+    client.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "serve":
+            service = DecodeService(args.queue_size, args.threads, args.batch_size, args.batch_wait_ms)
+            asyncio.run(serve(service, args.host, args.port, args.unix))
+        else:
+            symbologies = [s.strip() for s in args.symbologies.split(",") if s.strip()] if args.symbologies else None
+            asyncio.run(run_client(args.images, symbologies, args.repeat, args.concurrency, args.host, args.port,
+                                   args.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+import argparse
+import json
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import incr, span
+from page_source import MULTIPAGE_EXTENSIONS, is_multipage, iter_file_pages
+from zxing_batch import IMAGE_EXTENSIONS
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+DEFAULT_DB_PATH = os.environ.get("DECODE_INGEST_DB", "decode_results.sqlite")
+# Seconds between folder scans (a watchdog event wakes the loop earlier)
+DEFAULT_POLL_INTERVAL = float(os.environ.get("DECODE_INGEST_INTERVAL", "1.0"))
+# A file is complete once its size and mtime have not changed for this long
+DEFAULT_SETTLE_SECONDS = float(os.environ.get("DECODE_INGEST_SETTLE", "2.0"))
+# Files decoded, and committed, together
+DEFAULT_BATCH_SIZE = int(os.environ.get("DECODE_INGEST_BATCH", "32"))
+DEFAULT_WORKERS = int(os.environ.get("DECODE_INGEST_WORKERS", "4"))
+# Unreadable files are retried this many times before being recorded as errors
+MAX_ATTEMPTS = 3
+
+# Names scanners and copy tools use while a file is still being written
+PARTIAL_SUFFIXES = (".part", ".partial", ".tmp", ".crdownload", ".filepart")
+EXTENSIONS = IMAGE_EXTENSIONS | MULTIPAGE_EXTENSIONS
+
+
+# -----------------------------
+# CLASS: SQLite sink
+# -----------------------------
+class ResultSink:
+    """Decode results in SQLite, one row per code, indexed by payload.
+
+    ``write_batch()`` commits the results and file records of a whole
+    batch in a single transaction. The ``files`` table also remembers what
+    was ingested (path, size, mtime), so a restarted daemon skips it.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        if os.path.dirname(os.path.abspath(path)):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " id INTEGER PRIMARY KEY, payload TEXT NOT NULL, symbology TEXT, polygon TEXT, backend TEXT,"
+            " page INTEGER, source_path TEXT NOT NULL, decode_ms REAL, ingested_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS results_payload ON results(payload);"
+            "CREATE INDEX IF NOT EXISTS results_source ON results(source_path);"
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL, status TEXT NOT NULL,"
+            " error TEXT, results INTEGER NOT NULL, elapsed_ms REAL, processed_at REAL NOT NULL);"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def seen(self):
+        """{path: (size, mtime)} of every file already ingested."""
+        with self._lock:
+            return {path: (size, mtime) for path, size, mtime in self._db.execute("SELECT path, size, mtime FROM files")}
+
+    def write_batch(self, records):
+        """Store the records of one batch (see decode_file) in one transaction."""
+        now = time.time()
+        rows = []
+        files = []
+        for record in records:
+            for result in record["results"]:
+                rows.append((
+                    result["text"], result.get("symbology"), json.dumps(result.get("polygon")),
+                    result.get("backend"), result.get("page"), record["path"], result.get("elapsed_ms"), now,
+                ))
+            files.append((record["path"], record["size"], record["mtime"], "error" if record["error"] else "ok",
+                          record["error"], len(record["results"]), record["elapsed_ms"], now))
+        with self._lock, self._db:
+            # A re-ingested (changed) file replaces its earlier results rather than adding to them
+            self._db.executemany("DELETE FROM results WHERE source_path = ?", [(path,) for path, *_ in files])
+            self._db.executemany(
+                "INSERT INTO results (payload, symbology, polygon, backend, page, source_path, decode_ms, ingested_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows,
+            )
+            self._db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)", files)
+        return len(rows)
+
+    def lookup(self, payload):
+        """Every stored sighting of ``payload`` (uses the payload index)."""
+        with self._lock:
+            cursor = self._db.execute(
+                "SELECT payload, symbology, polygon, backend, page, source_path, decode_ms, ingested_at"
+                " FROM results WHERE payload = ? ORDER BY ingested_at", (payload,),
+            )
+            columns = [c[0] for c in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor]
+        for row in rows:
+            row["polygon"] = json.loads(row["polygon"]) if row["polygon"] else None
+        return rows
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# -----------------------------
+# CLASS: Folder watcher
+# -----------------------------
+class FolderWatcher:
+    """Finds files in a folder that are complete and not yet ingested.
+
+    A file is ready once its size and mtime have stayed the same for
+    ``settle`` seconds, so scanners still writing it are left alone, as
+    are hidden files and typical partial-download names. With the optional
+    ``watchdog`` package, filesystem events (inotify on Linux) wake the
+    daemon at once; otherwise it just polls.
+    """
+
+    def __init__(self, folder, settle=DEFAULT_SETTLE_SECONDS, recursive=False, seen=None):
+        # Absolute paths, so they match the paths stored in the sink
+        self.folder = os.path.abspath(folder)
+        self.settle = settle
+        self.recursive = recursive
+        self.seen = dict(seen or {})
+        self.changed = threading.Event()
+        self._pending = {}
+        self._observer = None
+
+    def start(self):
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return False
+        changed = self.changed
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                changed.set()
+
+        self._observer = Observer()
+        self._observer.schedule(Handler(), self.folder, recursive=self.recursive)
+        self._observer.daemon = True
+        self._observer.start()
+        return True
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=2)
+
+    def _candidates(self):
+        for root, dirs, files in os.walk(self.folder):
+            dirs.sort()
+            for name in sorted(files):
+                lower = name.lower()
+                if name.startswith((".", "~")) or lower.endswith(PARTIAL_SUFFIXES):
+                    continue
+                if os.path.splitext(lower)[1] in EXTENSIONS:
+                    yield os.path.join(root, name)
+            if not self.recursive:
+                break
+
+    def ready(self):
+        """Files that have settled since the last scan; each is returned once."""
+        now = time.monotonic()
+        ready = []
+        present = set()
+        for path in self._candidates():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            present.add(path)
+            signature = (st.st_size, st.st_mtime)
+            if self.seen.get(path) == signature or st.st_size == 0:
+                continue
+            previous = self._pending.get(path)
+            if previous is None or previous[0] != signature:
+                # New or still growing: start (or restart) the settle clock
+                self._pending[path] = (signature, now)
+            elif now - previous[1] >= self.settle:
+                ready.append((path, signature))
+        for path in [p for p in self._pending if p not in present]:
+            del self._pending[path]
+        for path, signature in ready:
+            del self._pending[path]
+            self.seen[path] = signature
+        return ready
+
+    def waiting(self):
+        """True while some files are still settling."""
+        return bool(self._pending)
+
+    def retry(self, path):
+        # Readable later, maybe: forget it and let it settle again
+        self.seen.pop(path, None)
+        self._pending[path] = (None, time.monotonic())
+
+
+# -----------------------------
+# FUNCTION: Decode one file
+# -----------------------------
+def decode_file(path, signature, symbologies, dedupe=False):
+    """Record {path, size, mtime, results, error, elapsed_ms} for one ingested file."""
+    from unified_decoder import decode
+
+    start = time.perf_counter()
+    record = {"path": os.path.abspath(path), "size": signature[0], "mtime": signature[1], "results": [], "error": None}
+    try:
+        if is_multipage(path):
+            for index, page in iter_file_pages(path):
+                for result in decode(page, symbologies, cache=False, dedupe=dedupe):
+                    result["page"] = index + 1
+                    record["results"].append(result)
+        else:
+            record["results"] = decode(path, symbologies, dedupe=dedupe)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return record
+
+
+# -----------------------------
+# CLASS: Daemon
+# -----------------------------
+class IngestDaemon:
+    """Watches a folder, decodes new files in batches and bulk-writes the results.
+
+    Decoding happens in this process on a thread pool, so the warm ZXing
+    pool, the decode cache and the Python decoders stay loaded for the
+    daemon's whole life. ``stop()`` (or SIGINT/SIGTERM) lets the batch in
+    progress finish and commit before the loop exits.
+    """
+
+    def __init__(self, folder, sink, symbologies, batch_size=DEFAULT_BATCH_SIZE, interval=DEFAULT_POLL_INTERVAL,
+                 settle=DEFAULT_SETTLE_SECONDS, workers=DEFAULT_WORKERS, recursive=False, dedupe=False):
+        self.sink = sink
+        self.symbologies = symbologies
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.dedupe = dedupe
+        self.watcher = FolderWatcher(folder, settle, recursive, sink.seen())
+        self.stats = {"files": 0, "results": 0, "errors": 0, "retries": 0, "batches": 0}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ingest")
+        self._attempts = {}
+        self._stopping = threading.Event()
+
+    def stop(self, *_):
+        if not self._stopping.is_set():
+            print("Stopping after the current batch...", file=sys.stderr)
+        self._stopping.set()
+        self.watcher.changed.set()
+
+    def process(self, ready):
+        """Decode and commit one batch of (path, signature) pairs."""
+        with span("ingest_batch"):
+            records = list(self._executor.map(
+                lambda item: decode_file(item[0], item[1], self.symbologies, self.dedupe), ready))
+            done = []
+            for (path, _), record in zip(ready, records):
+                if record["error"] and self._attempts.get(path, 0) + 1 < MAX_ATTEMPTS:
+                    # Possibly still being written despite a stable size: try again later
+                    self._attempts[path] = self._attempts.get(path, 0) + 1
+                    self.watcher.retry(path)
+                    self.stats["retries"] += 1
+                    continue
+                self._attempts.pop(path, None)
+                done.append(record)
+            stored = self.sink.write_batch(done)
+        self.stats["batches"] += 1
+        self.stats["files"] += len(done)
+        self.stats["results"] += stored
+        self.stats["errors"] += sum(record["error"] is not None for record in done)
+        for record in done:
+            incr("ingested_files", status="error" if record["error"] else "ok")
+        return done
+
+    def run_once(self):
+        ready = self.watcher.ready()
+        for i in range(0, len(ready), self.batch_size):
+            if self._stopping.is_set():
+                # Not started yet: picked up again on the next run
+                for path, _ in ready[i:]:
+                    self.watcher.retry(path)
+                break
+            for record in self.process(ready[i:i + self.batch_size]):
+                print(f"{record['path']}: {len(record['results'])} code(s)"
+                      + (f", error: {record['error']}" if record["error"] else ""))
+        return len(ready)
+
+    def run(self, once=False):
+        events = self.watcher.start()
+        print(f"Watching {self.watcher.folder} ({'filesystem events' if events else 'polling'}), "
+              f"results in {self.sink.path}", file=sys.stderr)
+        try:
+            while not self._stopping.is_set():
+                self.run_once()
+                if once and not self.watcher.waiting():
+                    break
+                self.watcher.changed.wait(self.interval)
+                self.watcher.changed.clear()
+        finally:
+            self.watcher.stop()
+            self._executor.shutdown(wait=True)
+        return self.stats
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main(argv=None):
+    from unified_decoder import SYMBOLOGIES
+
+    parser = argparse.ArgumentParser(description="Ingest scanner drops from a folder into a SQLite result store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    watch = sub.add_parser("watch", help="watch a folder and ingest new images")
+    watch.add_argument("folder")
+    watch.add_argument("--db", default=DEFAULT_DB_PATH)
+    watch.add_argument("--symbologies", default=",".join(SYMBOLOGIES), help="comma-separated backends to run")
+    watch.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    watch.add_argument("--interval", type=float, default=DEFAULT_POLL_INTERVAL, help="seconds between scans")
+    watch.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS,
+                       help="seconds a file must stay unchanged before it is read")
+    watch.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    watch.add_argument("--recursive", action="store_true")
+    watch.add_argument("--dedupe", action="store_true",
+                       help="for an image whose code region looks like a recent one, decode only that region and "
+                            "reuse the results if it yields the same payloads; look-alike labels still get a full decode")
+    watch.add_argument("--once", action="store_true", help="ingest what is there now, then exit")
+    query = sub.add_parser("query", help="look up stored results by payload")
+    query.add_argument("payload")
+    query.add_argument("--db", default=DEFAULT_DB_PATH)
+    args = parser.parse_args(argv)
+
+    sink = ResultSink(args.db)
+    try:
+        if args.command == "query":
+            for row in sink.lookup(args.payload):
+                print(json.dumps(row, ensure_ascii=False))
+            return 0
+
+        if not os.path.isdir(args.folder):
+            print(f"Error: {args.folder} is not a folder")
+            return 1
+        symbologies = [s.strip() for s in args.symbologies.split(",") if s.strip()]
+        daemon = IngestDaemon(args.folder, sink, symbologies, args.batch_size, args.interval, args.settle,
+                              args.workers, args.recursive, args.dedupe)
+        signal.signal(signal.SIGINT, daemon.stop)
+        signal.signal(signal.SIGTERM, daemon.stop)
+        stats = daemon.run(args.once)
+        print(f"Ingested {stats['files']} files ({stats['results']} codes, {stats['errors']} errors) "
+              f"in {stats['batches']} batches", file=sys.stderr)
+        return 0
+    finally:
+        sink.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
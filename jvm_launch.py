@@ -0,0 +1,185 @@
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from zxing_worker import CORE_JAR, JAR_DIR, JAVASE_JAR, JCOMMANDER_JAR, WORKER_SOURCE, file_uri
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+RUNNER_MAIN = "com.google.zxing.client.j2se.CommandLineRunner"
+# One-shot runs are over before C2 pays off; the serial GC starts fastest
+RUNNER_FLAGS = ["-XX:TieredStopAtLevel=1", "-XX:+UseSerialGC"]
+# The long-lived worker keeps full tiered compilation for throughput
+WORKER_FLAGS = ["-XX:+UseSerialGC"]
+# DECODE_JVM_FLAGS replaces both lists (space-separated)
+EXTRA_FLAGS = os.environ.get("DECODE_JVM_FLAGS")
+# Set DECODE_JVM_CDS=0 to never build or use a class data sharing archive
+CDS_ENABLED = os.environ.get("DECODE_JVM_CDS", "1") != "0"
+# Image decoded by the training run that records the classes to archive
+TRAINING_IMAGE = os.environ.get("DECODE_JVM_TRAINING_IMAGE", os.path.join(JAR_DIR, "images", "barcode-image.jpg"))
+
+JARS = [JAVASE_JAR, CORE_JAR, JCOMMANDER_JAR]
+
+
+def classpath(jars=JARS):
+    """ZXing classpath with the platform's separator (';' on Windows, ':' elsewhere)."""
+    return os.pathsep.join(jars)
+
+
+_java_major = None
+
+
+def java_major():
+    """Major version of the ``java`` on PATH (8, 11, 17, ...), or None without one."""
+    global _java_major
+    if _java_major is None:
+        if shutil.which("java") is None:
+            return None
+        result = subprocess.run(["java", "-version"], capture_output=True, text=True)
+        match = re.search(r'version "(?:1\.)?(\d+)', result.stderr)
+        _java_major = int(match.group(1)) if match else 0
+    return _java_major or None
+
+
+# -----------------------------
+# FUNCTION: Class data sharing archive
+# -----------------------------
+def archive_path(profile):
+    # One archive per profile and JDK: an archive only loads into the JDK that wrote it
+    return os.path.join(JAR_DIR, f"zxing-{profile}-jdk{java_major()}.jsa")
+
+
+def archive_current(profile):
+    path = archive_path(profile)
+    if not os.path.exists(path):
+        return False
+    # Rebuilt when a jar (or the worker source) is newer than the archive
+    return all(os.path.getmtime(source) <= os.path.getmtime(path)
+               for source in JARS + [WORKER_SOURCE] if os.path.exists(source))
+
+
+def _train(profile, dump_flag, image):
+    # Run the profile's normal workload once; the JVM writes the archive at exit
+    if profile == "worker":
+        command = ["java", *WORKER_FLAGS, dump_flag, "-cp", classpath(), WORKER_SOURCE]
+        stdin = f"PING\n{file_uri(image)}\n"
+    else:
+        command = ["java", *RUNNER_FLAGS, dump_flag, "-cp", classpath(), RUNNER_MAIN, file_uri(image)]
+        stdin = None
+    subprocess.run(command, input=stdin, capture_output=True, text=True, cwd=JAR_DIR, timeout=300)
+
+
+_build_lock = threading.Lock()
+
+
+def build_archive(profile, image=TRAINING_IMAGE, force=False):
+    """Write the AppCDS archive for ``profile`` ("runner" or "worker") next to the jars.
+
+    Needs JDK 13+ (-XX:ArchiveClassesAtExit). The archive is written under a
+    temporary name and moved into place, so concurrent builders never leave
+    a half-written file. Returns the archive path or None.
+    """
+    major = java_major()
+    if major is None or major < 13 or not os.path.exists(image):
+        return None
+    path = archive_path(profile)
+    with _build_lock:
+        if not force and archive_current(profile):
+            return path
+        temp = f"{path}.{os.getpid()}.tmp"
+        try:
+            _train(profile, f"-XX:ArchiveClassesAtExit={temp}", image)
+            if not os.path.exists(temp):
+                print(f"Warning: JVM did not write a CDS archive for {profile}", file=sys.stderr)
+                return None
+            os.replace(temp, path)
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"Warning: CDS archive for {profile} not built ({e})", file=sys.stderr)
+            return None
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+    return path
+
+
+def cds_flags(profile, build=True):
+    """Flags that load the profile's archive, building it on first use when ``build``."""
+    if not CDS_ENABLED:
+        return []
+    path = archive_path(profile) if archive_current(profile) else (build_archive(profile) if build else None)
+    # -Xshare:auto falls back to normal class loading if the archive is rejected
+    return [f"-XX:SharedArchiveFile={path}", "-Xshare:auto"] if path else []
+
+
+# -----------------------------
+# FUNCTION: Commands
+# -----------------------------
+def java_command(args, profile="runner", cds=True):
+    """``java`` command line for the ZXing classpath with the profile's startup flags."""
+    flags = EXTRA_FLAGS.split() if EXTRA_FLAGS is not None else (WORKER_FLAGS if profile == "worker" else RUNNER_FLAGS)
+    if cds and java_major() is not None:
+        flags = flags + cds_flags(profile)
+    return ["java", *flags, "-cp", classpath(), *args]
+
+
+def runner_command(uris, cds=True):
+    """One-shot CommandLineRunner over file URIs."""
+    return java_command([RUNNER_MAIN, *uris], "runner", cds)
+
+
+# -----------------------------
+# FUNCTION: Measure the saving
+# -----------------------------
+def measure(image=TRAINING_IMAGE, runs=5):
+    """Median wall time (ms) of one CommandLineRunner decode per launch profile."""
+    uri = file_uri(image)
+    profiles = {
+        "default": ["java", "-cp", classpath(), RUNNER_MAIN, uri],
+        "flags": runner_command([uri], cds=False),
+        "flags+cds": runner_command([uri]),
+    }
+    report = {}
+    for name, command in profiles.items():
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(command, capture_output=True, text=True, cwd=JAR_DIR)
+            times.append((time.perf_counter() - start) * 1000)
+        report[name] = round(statistics.median(times), 1)
+    report["saving_ms"] = round(report["default"] - report["flags+cds"], 1)
+    report["saving_pct"] = round(100.0 * report["saving_ms"] / report["default"], 1) if report["default"] else 0.0
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Build and measure the ZXing JVM class data sharing archives.")
+    parser.add_argument("action", choices=["build", "measure", "clean"])
+    parser.add_argument("--image", default=TRAINING_IMAGE, help="image decoded by the training and timing runs")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if java_major() is None:
+        print("java not found on PATH.")
+        sys.exit(1)
+    if args.action == "build":
+        for profile in ("runner", "worker"):
+            print(f"{profile}: {build_archive(profile, args.image, force=True) or 'not built (needs JDK 13+)'}")
+    elif args.action == "clean":
+        for profile in ("runner", "worker"):
+            if os.path.exists(archive_path(profile)):
+                os.remove(archive_path(profile))
+                print(f"Removed {archive_path(profile)}")
+    else:
+        report = measure(args.image, args.runs)
+        print(json.dumps(report))
+        print(f"JVM startup: {report['default']:.0f} ms -> {report['flags+cds']:.0f} ms "
+              f"(saves {report['saving_ms']:.0f} ms, {report['saving_pct']:.0f}%)")
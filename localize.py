@@ -0,0 +1,150 @@
+import cv2
+import numpy as np
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Longest side of the downscaled copy used for localization
+DEFAULT_MAX_SIDE = 800
+# Padding added around each region, as a fraction of its size
+DEFAULT_PAD_RATIO = 0.15
+# Regions smaller than this fraction of the frame are ignored
+DEFAULT_MIN_AREA_RATIO = 0.0005
+DEFAULT_MAX_REGIONS = 6
+
+
+def to_gray(image):
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+# -----------------------------
+# FUNCTION: Propose regions
+# -----------------------------
+def propose_regions(image, max_side=DEFAULT_MAX_SIDE, pad_ratio=DEFAULT_PAD_RATIO,
+                    min_area_ratio=DEFAULT_MIN_AREA_RATIO, max_regions=DEFAULT_MAX_REGIONS):
+    """Cheap barcode-region proposals: gradient energy + morphology on a small copy.
+
+    Barcodes and 2D codes are dense patches of strong edges. The image is
+    downscaled so its longest side is ``max_side``, the Sobel gradient
+    magnitude is blurred and Otsu-thresholded, and a closing joins the bars
+    or modules of one symbol into a blob. Blob bounding boxes are scaled back
+    to full resolution, padded and returned as (x, y, w, h), densest first.
+    """
+    gray = to_gray(image)
+    h, w = gray.shape[:2]
+    scale = min(1.0, max_side / float(max(h, w)))
+    small = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+
+    gx = cv2.Sobel(small, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(small, cv2.CV_32F, 0, 1, ksize=3)
+    energy = cv2.convertScaleAbs(cv2.magnitude(gx, gy))
+    energy = cv2.blur(energy, (7, 7))
+    _, mask = cv2.threshold(energy, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    k = max(3, int(max(small.shape) / 60))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (k, k)))
+    mask = cv2.erode(mask, None, iterations=2)
+    mask = cv2.dilate(mask, None, iterations=2)
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    min_area = min_area_ratio * small.shape[0] * small.shape[1]
+    scored = []
+    for contour in contours:
+        x, y, bw, bh = cv2.boundingRect(contour)
+        if bw * bh < min_area:
+            continue
+        density = float(energy[y:y + bh, x:x + bw].mean())
+        scored.append((density, x, y, bw, bh))
+    scored.sort(reverse=True)
+
+    regions = []
+    for _, x, y, bw, bh in scored[:max_regions]:
+        # Back to full resolution, then pad so quiet zones are kept
+        x, y, bw, bh = x / scale, y / scale, bw / scale, bh / scale
+        px, py = bw * pad_ratio, bh * pad_ratio
+        x0, y0 = max(0, int(x - px)), max(0, int(y - py))
+        x1, y1 = min(w, int(x + bw + px)), min(h, int(y + bh + py))
+        regions.append((x0, y0, x1 - x0, y1 - y0))
+    return merge_regions(regions)
+
+
+def merge_regions(regions):
+    """Merge overlapping boxes so no pixel is decoded twice."""
+    merged = list(regions)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                ax, ay, aw, ah = merged[i]
+                bx, by, bw, bh = merged[j]
+                if ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah:
+                    x0, y0 = min(ax, bx), min(ay, by)
+                    x1, y1 = max(ax + aw, bx + bw), max(ay + ah, by + bh)
+                    merged[i] = (x0, y0, x1 - x0, y1 - y0)
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+def offset_polygon(polygon, dx, dy):
+    if polygon is None:
+        return None
+    return [[int(x) + dx, int(y) + dy] for x, y in polygon]
+
+
+# -----------------------------
+# FUNCTION: Decode crops first
+# -----------------------------
+def decode_regions(image, decode, regions=None, fallback=True):
+    """Run ``decode`` on padded crops first, and on the full frame only if needed.
+
+    ``decode(view)`` gets a NumPy view (no copy) of each region and returns
+    result dicts whose ``polygon`` is in crop coordinates; polygons are
+    moved back to full-frame coordinates here. ``fallback`` may be a
+    callable that decodes the full frame itself (True means
+    ``decode(image)``). Returns (results, report), where the report says how
+    many pixels the localization saved.
+    """
+    if regions is None:
+        regions = propose_regions(image)
+    frame_pixels = image.shape[0] * image.shape[1]
+    decoded_pixels = 0
+    results = []
+    seen = set()
+    for x, y, w, h in regions:
+        decoded_pixels += w * h
+        for result in decode(image[y:y + h, x:x + w]):
+            key = (result.get("symbology"), result.get("text"))
+            if key in seen:
+                continue
+            seen.add(key)
+            result["polygon"] = offset_polygon(result.get("polygon"), x, y)
+            results.append(result)
+
+    used_fallback = False
+    if not results and fallback:
+        used_fallback = True
+        decoded_pixels += frame_pixels
+        results = fallback() if callable(fallback) else decode(image)
+
+    report = {
+        "regions": len(regions),
+        "frame_pixels": frame_pixels,
+        "decoded_pixels": decoded_pixels,
+        "pixels_saved": frame_pixels - decoded_pixels,
+        "saved_ratio": round(1.0 - decoded_pixels / frame_pixels, 4) if frame_pixels else 0.0,
+        "fallback": used_fallback,
+    }
+    return results, report
+
+
+def format_report(report):
+    return (
+        f"Localization: {report['regions']} region(s), decoded {report['decoded_pixels']:,} of "
+        f"{report['frame_pixels']:,} pixels ({report['saved_ratio'] * 100:.1f}% saved)"
+        + (", full-frame fallback used" if report["fallback"] else "")
+    )
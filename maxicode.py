@@ -2,9 +2,16 @@ import subprocess
 import os
 import sys
 import cv2
-import numpy as np
 from urllib.parse import quote
 
+from annotation_writer import annotate, get_writer
+from decode_cache import cache_key, get_cache
+from decode_scheduler import run_backends, source_scope
+from jvm_launch import runner_command
+from metrics import incr, span
+from zxing_batch import DEFAULT_CHUNK_SIZE, collect_images, decode_batch
+from zxing_worker import ZXingWorkerError, ZXingWorkerTimeout, get_pool
+
 # -----------------------------
 # CONFIG: Paths to ZXing JARs
 # -----------------------------
@@ -24,20 +31,34 @@ def decode_barcode(image_path):
         if not os.path.exists(jar):
             return f"Error: Required ZXing JAR not found: {jar}"
 
+    # Same image bytes decoded before: skip the JVM entirely
+    cache = get_cache()
+    if cache is not None:
+        with open(image_path, "rb") as f:
+            key = cache_key(f.read(), "maxicode")
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+
     image_abs = os.path.abspath(image_path)
     image_abs_forward = image_abs.replace("\\", "/")
-    file_uri = f"file:///{quote(image_abs_forward)}"
+    image_uri = f"file:///{quote(image_abs_forward)}"
 
-    classpath = f"{JAVASE_JAR};{CORE_JAR};{JCOMMANDER_JAR}"  # Windows
-    cmd = [
-        "java", "-cp", classpath,
-        "com.google.zxing.client.j2se.CommandLineRunner",
-        file_uri
-    ]
+    def pool():
+        # Reuse a warm JVM when one can be started
+        with span("zxing_attempt", path="pool"):
+            return get_pool().decode(image_uri)
 
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        output = result.stdout.strip()
+        # A pool that keeps failing to start is skipped for a while (circuit breaker)
+        backend, output = run_backends([("pool", pool)], source_scope(image_path), errors=(ZXingWorkerError,),
+                                       neutral=(ZXingWorkerTimeout,))
+        if backend is None:
+            # Only built on fallback: it may probe java and build the CDS archive (see jvm_launch)
+            cmd = runner_command([image_uri])
+            with span("zxing_attempt", path="java"):
+                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            output = result.stdout.strip()
 
         # Parse Raw and Parsed results
         output_lines = output.splitlines()
@@ -63,16 +84,39 @@ def decode_barcode(image_path):
                 parts = line.split(":")[1].strip().replace("(", "").replace(")", "").split(",")
                 points.append((int(float(parts[0])), int(float(parts[1]))))
 
-        return {
+        decoded = {
             "raw": raw_result,
             "parsed": parsed_result,
             "points": points,
             "full_output": output
         }
+        # Misses and worker error replies are not cached, so a later run tries again
+        if cache is not None and decoded["raw"]:
+            cache.put(key, decoded)
+        return decoded
 
     except subprocess.CalledProcessError as e:
+        incr("decode_failures", stage="java")
         return f"Error running Java: {e.stderr}"
 
+# -----------------------------
+# FUNCTION: Decode many barcodes
+# -----------------------------
+def decode_barcodes(image_paths, chunk_size=DEFAULT_CHUNK_SIZE, jobs=1):
+    """Decodes many images, one JVM start per chunk of ``chunk_size`` images.
+
+    Yields one dict per image with the same keys as decode_barcode() plus
+    ``path`` and ``error``.
+    """
+    for record in decode_batch(image_paths, chunk_size, jobs):
+        yield {
+            "path": record["path"],
+            "raw": record["raw"],
+            "parsed": record["parsed"],
+            "points": [tuple(p) for p in record["points"]],
+            "error": record["error"],
+        }
+
 # -----------------------------
 # FUNCTION: Draw bounding box
 # -----------------------------
@@ -87,20 +131,28 @@ def draw_bounding_box(image_path, points, save_path="annotated_barcode.png"):
         print("Error: Unable to read image for drawing.")
         return
 
-    points_array = np.array(points, dtype=np.int32).reshape((-1, 1, 2))
-    cv2.polylines(image, [points_array], isClosed=True, color=(0, 255, 0), thickness=2)
-    cv2.imwrite(save_path, image)
-    print(f"Annotated image saved as {save_path}")
-
-    cv2.imshow("Detected Barcode", image)
-    print("Press any key to close the window.")
-    cv2.waitKey(0)
-    cv2.destroyAllWindows()
+    # Written in the background; the window is skipped when headless
+    annotate(image, [(points, None)], save_path, "Detected Barcode")
 
 # -----------------------------
 # MAIN
 # -----------------------------
 if __name__ == "__main__":
+    # Batch mode: several images or a directory share JVM starts
+    # Set DECODE_ANNOTATE_DIR to also write (sampled) annotated copies, off the decode path
+    if len(sys.argv) > 2 or (len(sys.argv) == 2 and os.path.isdir(sys.argv[1])):
+        annotate_dir = os.environ.get("DECODE_ANNOTATE_DIR")
+        if annotate_dir:
+            os.makedirs(annotate_dir, exist_ok=True)
+        for decoded in decode_barcodes(collect_images(sys.argv[1:])):
+            status = decoded["raw"] or decoded["error"] or "No barcode found"
+            print(f"{decoded['path']}: {status}")
+            if annotate_dir and len(decoded["points"]) >= 4:
+                stem = os.path.splitext(os.path.basename(decoded["path"]))[0]
+                get_writer().submit(decoded["path"], [(decoded["points"], None)],
+                                    os.path.join(annotate_dir, f"annotated_{stem}.png"))
+        sys.exit(0)
+
     image_path = sys.argv[1] if len(sys.argv) > 1 else "./images/maxi-code.png"
     decoded = decode_barcode(image_path)
 
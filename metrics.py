@@ -0,0 +1,227 @@
+import atexit
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# DECODE_METRICS=1 turns instrumentation on; everything below is a no-op otherwise
+ENABLED = os.environ.get("DECODE_METRICS", "0") not in ("", "0")
+# JSON log lines: a path, or "-" for stderr (unset: no log, only the aggregates)
+LOG_PATH = os.environ.get("DECODE_METRICS_LOG", "")
+# Prometheus text snapshot written here at exit
+PROM_PATH = os.environ.get("DECODE_METRICS_PROM", "")
+PREFIX = "decode"
+# Span histogram buckets, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_counters = {}
+_spans = {}
+_log_file = None
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def enable(log_path=None):
+    global ENABLED, LOG_PATH
+    ENABLED = True
+    if log_path is not None:
+        LOG_PATH = log_path
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def _key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _log(record):
+    global _log_file
+    if not LOG_PATH:
+        return
+    line = json.dumps(record, ensure_ascii=False)
+    with _lock:
+        if _log_file is None:
+            _log_file = sys.stderr if LOG_PATH == "-" else open(LOG_PATH, "a", encoding="utf-8")
+        _log_file.write(line + "\n")
+        _log_file.flush()
+
+
+# -----------------------------
+# FUNCTION: Counters
+# -----------------------------
+def incr(name, value=1, **labels):
+    """Add ``value`` to counter ``name`` with ``labels`` (no-op when disabled)."""
+    if not ENABLED:
+        return
+    key = (name, _key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _log({"ts": round(time.time(), 6), "event": "counter", "name": name, "value": value, **labels})
+
+
+# -----------------------------
+# CLASS: Timing span
+# -----------------------------
+class _Span:
+    __slots__ = ("name", "labels", "start", "error")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.error = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        key = (self.name, _key(self.labels))
+        with _lock:
+            entry = _spans.get(key)
+            if entry is None:
+                entry = _spans[key] = {"count": 0, "sum": 0.0, "errors": 0, "buckets": [0] * len(BUCKETS)}
+            entry["count"] += 1
+            entry["sum"] += seconds
+            if self.error:
+                entry["errors"] += 1
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    entry["buckets"][i] += 1
+                    break
+        record = {"ts": round(time.time(), 6), "event": "span", "stage": self.name,
+                  "ms": round(seconds * 1000, 3), **self.labels}
+        if self.error:
+            record["error"] = self.error
+        _log(record)
+        return False
+
+
+def span(name, **labels):
+    """Context manager timing one stage, e.g. ``with span("imread"):``.
+
+    Returns a shared no-op object when instrumentation is disabled, so a
+    disabled span costs one function call and one global lookup.
+    """
+    if not ENABLED:
+        return _NOOP
+    return _Span(name, labels)
+
+
+# -----------------------------
+# FUNCTION: Export
+# -----------------------------
+def snapshot():
+    """All counters and span aggregates as a JSON-ready dict."""
+    with _lock:
+        counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in _counters.items()]
+        spans = [
+            {"stage": name, "labels": dict(labels), "count": e["count"], "errors": e["errors"],
+             "sum_ms": round(e["sum"] * 1000, 3), "mean_ms": round(e["sum"] * 1000 / e["count"], 3)}
+            for (name, labels), e in _spans.items()
+        ]
+    return {"counters": counters, "spans": spans}
+
+
+def _metric_name(name):
+    return f"{PREFIX}_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{re.sub(r"[^a-zA-Z0-9_]", "_", k)}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def prometheus_text():
+    """Prometheus text exposition format: counters plus one histogram per span stage."""
+    with _lock:
+        counters = sorted(_counters.items())
+        spans = sorted((key, dict(entry, buckets=list(entry["buckets"]))) for key, entry in _spans.items())
+    lines = []
+    seen = set()
+    for (name, labels), value in counters:
+        metric = _metric_name(name) + "_total"
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_label_text(labels)} {value}")
+
+    metric = f"{PREFIX}_stage_seconds"
+    if spans:
+        lines.append(f"# TYPE {metric} histogram")
+    for (name, labels), entry in spans:
+        labels = (("stage", name),) + labels
+        cumulative = 0
+        for bound, count in zip(BUCKETS, entry["buckets"]):
+            cumulative += count
+            lines.append(f"{metric}_bucket{_label_text(labels, [('le', repr(bound))])} {cumulative}")
+        lines.append(f"{metric}_bucket{_label_text(labels, [('le', '+Inf')])} {entry['count']}")
+        lines.append(f"{metric}_sum{_label_text(labels)} {entry['sum']:.6f}")
+        lines.append(f"{metric}_count{_label_text(labels)} {entry['count']}")
+
+    if spans:
+        lines.append(f"# TYPE {PREFIX}_stage_errors_total counter")
+    for (name, labels), entry in spans:
+        lines.append(f"{PREFIX}_stage_errors_total{_label_text((('stage', name),) + labels)} {entry['errors']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _spans.clear()
+
+
+def _at_exit():
+    if ENABLED and PROM_PATH:
+        try:
+            write_prometheus(PROM_PATH)
+        except OSError as e:
+            print(f"Warning: could not write metrics to {PROM_PATH}: {e}", file=sys.stderr)
+
+
+atexit.register(_at_exit)
+
+
+if __name__ == "__main__":
+    # Overhead check: disabled vs enabled span cost
+    n = 200000
+    for state in (False, True):
+        ENABLED = state
+        start = time.perf_counter()
+        for _ in range(n):
+            with span("overhead"):
+                pass
+        print(f"{'enabled' if state else 'disabled':>8}: {(time.perf_counter() - start) * 1e9 / n:.0f} ns per span")
@@ -0,0 +1,190 @@
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from localize import propose_regions
+from metrics import incr
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Side of the difference grid: 16 gives a 256-bit dHash, fine enough to
+# tell apart two codes printed from the same label template
+HASH_SIZE = int(os.environ.get("DECODE_DEDUPE_HASH_SIZE", "16"))
+# Hashes differing in at most this many bits are the same code
+DEFAULT_MAX_DISTANCE = int(os.environ.get("DECODE_DEDUPE_DISTANCE", "8"))
+# Recently decoded images remembered, and for how long (seconds)
+DEFAULT_MAX_ITEMS = int(os.environ.get("DECODE_DEDUPE_ITEMS", "512"))
+DEFAULT_TTL = float(os.environ.get("DECODE_DEDUPE_TTL", "30"))
+# Also reuse "nothing found" (off: a code just entering the frame could be missed)
+DEFAULT_REUSE_EMPTY = os.environ.get("DECODE_DEDUPE_EMPTY", "0") == "1"
+
+
+# -----------------------------
+# FUNCTION: Perceptual hash
+# -----------------------------
+def dhash(image, hash_size=HASH_SIZE):
+    """Difference hash: is each pixel of a tiny grayscale copy brighter than its right neighbour?
+
+    Robust to small shifts, noise, exposure changes and recompression, so
+    consecutive frames of the same label hash within a few bits. Returns
+    a ``hash_size * hash_size``-bit int.
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def code_region(image):
+    """(x, y, w, h) of the densest code-like region (see localize), or None."""
+    regions = propose_regions(image, max_regions=1)
+    return regions[0] if regions else None
+
+
+def code_hash(image, hash_size=HASH_SIZE, region=None):
+    """dHash of the densest code-like region (see localize), not of the whole frame.
+
+    A whole-frame hash is dominated by the label, belt and background, so
+    a new label from the same template lands within a few bits of the last
+    one. Hashing the localized code itself makes the hash change with the
+    code's content. Pass ``region`` if code_region() was already run; falls
+    back to the whole frame when nothing is found.
+
+    Two different codes can still hash within a few bits (1D and PDF417
+    codes from one template especially), so only reuse results unchecked
+    where a wrong payload is harmless, e.g. consecutive video frames.
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    region = region or code_region(gray)
+    if region:
+        x, y, w, h = region
+        gray = gray[y:y + h, x:x + w]
+    return dhash(gray, hash_size)
+
+
+def without_polygons(results):
+    """Reused results: the payload carries over, positions from another frame do not."""
+    return [dict(result, polygon=None) for result in results]
+
+
+# -----------------------------
+# CLASS: Index of recent decodes
+# -----------------------------
+class NearDuplicateIndex:
+    """Decode results of recent images, looked up by perceptual hash.
+
+    ``get()`` returns the results stored for the closest hash within
+    ``max_distance`` bits under the same ``namespace`` (decoder and
+    options), ignoring entries older than ``ttl`` seconds. At most
+    ``max_items`` entries are kept; the oldest is overwritten first. Hashes
+    of ``hash_bits`` bits live in one NumPy byte array, so a lookup is a
+    single vectorised XOR and popcount over the whole index.
+    """
+
+    def __init__(self, max_items=DEFAULT_MAX_ITEMS, max_distance=DEFAULT_MAX_DISTANCE, ttl=DEFAULT_TTL,
+                 reuse_empty=DEFAULT_REUSE_EMPTY, hash_bits=HASH_SIZE * HASH_SIZE):
+        self.max_items = max(1, max_items)
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.reuse_empty = reuse_empty
+        self._hash_bytes = (hash_bits + 7) // 8
+        self._hashes = np.zeros((self.max_items, self._hash_bytes), dtype=np.uint8)
+        self._stamps = np.full(self.max_items, -np.inf)
+        self._namespaces = np.full(self.max_items, -1, dtype=np.int32)
+        self._values = [None] * self.max_items
+        self._namespace_ids = {}
+        self._next = 0
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "rejected": 0, "puts": 0, "evictions": 0}
+
+    def _namespace(self, namespace):
+        return self._namespace_ids.setdefault(namespace, len(self._namespace_ids))
+
+    def _bytes(self, image_hash):
+        return np.frombuffer(image_hash.to_bytes(self._hash_bytes, "big"), dtype=np.uint8)
+
+    def get(self, image_hash, namespace=""):
+        """(results, distance) of the nearest live entry within max_distance, or (None, None)."""
+        now = time.monotonic()
+        with self._lock:
+            self.stats["lookups"] += 1
+            live = (self._stamps >= now - self.ttl) & (self._namespaces == self._namespace(namespace))
+            candidates = np.nonzero(live)[0]
+            if len(candidates):
+                diff = np.bitwise_xor(self._hashes[candidates], self._bytes(image_hash))
+                distances = np.unpackbits(diff, axis=1).sum(1)
+                best = int(np.argmin(distances))
+                if distances[best] <= self.max_distance:
+                    self.stats["hits"] += 1
+                    incr("near_duplicate", result="hit")
+                    return self._values[candidates[best]], int(distances[best])
+            self.stats["misses"] += 1
+            incr("near_duplicate", result="miss")
+            return None, None
+
+    def put(self, image_hash, results, namespace=""):
+        """Remember the results decoded for an image (empty results only with ``reuse_empty``)."""
+        if not results and not self.reuse_empty:
+            return
+        with self._lock:
+            slot = self._next
+            if self._values[slot] is not None:
+                self.stats["evictions"] += 1
+            self._hashes[slot] = self._bytes(image_hash)
+            self._stamps[slot] = time.monotonic()
+            self._namespaces[slot] = self._namespace(namespace)
+            self._values[slot] = results
+            self._next = (slot + 1) % self.max_items
+            self.stats["puts"] += 1
+
+    def reject(self):
+        """Count a hit whose payload the caller could not confirm (it decoded in full instead)."""
+        with self._lock:
+            self.stats["rejected"] += 1
+        incr("near_duplicate", result="rejected")
+
+    def decodes_avoided(self):
+        return self.stats["hits"] - self.stats["rejected"]
+
+    def clear(self):
+        with self._lock:
+            self._stamps[:] = -np.inf
+            self._namespaces[:] = -1
+            self._values = [None] * self.max_items
+            self._next = 0
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_index():
+    """Shared process-wide index (created on first use)."""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = NearDuplicateIndex()
+        return _default_index
+
+
+if __name__ == "__main__":
+    # Hash distances between images, e.g. consecutive frames of one camera
+    paths = sys.argv[1:]
+    hashes = []
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            print(f"Warning: unable to read {path}", file=sys.stderr)
+            continue
+        hashes.append((path, code_hash(image)))
+    for (path_a, a), (path_b, b) in zip(hashes, hashes[1:]):
+        print(f"{hamming(a, b):2d}  {path_a} -> {path_b}")
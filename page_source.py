@@ -0,0 +1,217 @@
+import argparse
+import glob
+import json
+import os
+import queue
+import sys
+import threading
+
+import cv2
+import numpy as np
+
+from zxing_batch import IMAGE_EXTENSIONS
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Pages decoded ahead of the consumer; memory is bounded by this many pages
+DEFAULT_PREFETCH = 2
+# Rendering resolution for PDF pages (barcodes need ~200-300 dpi)
+PDF_DPI = int(os.environ.get("DECODE_PDF_DPI", "200"))
+MULTIPAGE_EXTENSIONS = {".tif", ".tiff", ".gif", ".pdf"}
+
+
+def page_label(source, index):
+    return f"{source}#{index + 1}"
+
+
+def _pil_to_bgr(frame):
+    if frame.mode not in ("L", "RGB"):
+        frame = frame.convert("RGB")
+    array = np.asarray(frame)
+    return array if array.ndim == 2 else cv2.cvtColor(array, cv2.COLOR_RGB2BGR)
+
+
+# -----------------------------
+# FUNCTION: Pages of one file
+# -----------------------------
+def iter_tiff_pages(path):
+    """Frames of a multi-page TIFF (or animated GIF), decoded one at a time."""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        index = 0
+        while True:
+            try:
+                image.seek(index)
+            except EOFError:
+                return
+            # Only the current frame is held in memory
+            yield index, _pil_to_bgr(image)
+            index += 1
+
+
+def iter_pdf_pages(path, dpi=PDF_DPI):
+    """Pages of a PDF rendered straight to arrays with PyMuPDF (no temporary files)."""
+    try:
+        import fitz
+    except ImportError as e:
+        raise ImportError("PDF input needs PyMuPDF (pip install pymupdf)") from e
+
+    with fitz.open(path) as document:
+        zoom = dpi / 72.0
+        for index, page in enumerate(document):
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            array = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width, pixmap.n)
+            yield index, cv2.cvtColor(array, cv2.COLOR_RGB2BGR) if pixmap.n == 3 else array[..., 0].copy()
+
+
+def iter_file_pages(path):
+    """(index, BGR or gray ndarray) for every page/frame of one file, lazily."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        yield from iter_pdf_pages(path)
+    elif ext in MULTIPAGE_EXTENSIONS:
+        yield from iter_tiff_pages(path)
+    else:
+        image = cv2.imread(path)
+        if image is None:
+            raise ValueError(f"Unable to read image '{path}'")
+        yield 0, image
+
+
+def is_multipage(path):
+    return os.path.splitext(path)[1].lower() in MULTIPAGE_EXTENSIONS
+
+
+# -----------------------------
+# FUNCTION: Many sources
+# -----------------------------
+def expand_sources(inputs, recursive=True):
+    """Yield files from paths, directories and glob patterns, in order.
+
+    Directories are walked lazily; only one directory listing is held at a
+    time.
+    """
+    extensions = IMAGE_EXTENSIONS | MULTIPAGE_EXTENSIONS
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in extensions:
+                        yield os.path.join(root, name)
+                if not recursive:
+                    break
+        elif os.path.isfile(item):
+            yield item
+        elif glob.has_magic(item):
+            yield from sorted(glob.iglob(item, recursive=recursive))
+        else:
+            print(f"Warning: {item} not found, skipping.", file=sys.stderr)
+
+
+def iter_pages(inputs, recursive=True):
+    """Yield (source, index, image) for every page of every input; errors become image=None."""
+    for source in expand_sources(inputs, recursive):
+        try:
+            for index, image in iter_file_pages(source):
+                yield source, index, image
+        except (OSError, ValueError) as e:
+            print(f"Warning: {source}: {e}", file=sys.stderr)
+            yield source, 0, None
+
+
+# -----------------------------
+# CLASS: Bounded prefetch
+# -----------------------------
+class Prefetcher:
+    """Runs an iterator on a background thread, at most ``size`` items ahead.
+
+    Page decoding (TIFF decompression, PDF rendering) overlaps with the
+    barcode decoding of the previous page, and memory stays flat because the
+    reader blocks once ``size`` pages are waiting. Exceptions in the reader
+    are re-raised in the consumer.
+    """
+
+    _DONE = object()
+
+    def __init__(self, iterable, size=DEFAULT_PREFETCH):
+        self._queue = queue.Queue(maxsize=max(1, size))
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(iter(iterable),), daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stopping.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, iterator):
+        try:
+            for item in iterator:
+                if not self._put((item, None)):
+                    return
+        except BaseException as e:
+            self._put((None, e))
+            return
+        self._put((self._DONE, None))
+
+    def __iter__(self):
+        try:
+            while True:
+                item, error = self._queue.get()
+                if error is not None:
+                    raise error
+                if item is self._DONE:
+                    return
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        self._stopping.set()
+
+
+def stream_pages(inputs, prefetch=DEFAULT_PREFETCH, recursive=True):
+    """iter_pages with ``prefetch`` pages read ahead on a background thread."""
+    return Prefetcher(iter_pages(inputs, recursive), prefetch)
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main(argv=None):
+    from unified_decoder import SYMBOLOGIES, decode
+
+    parser = argparse.ArgumentParser(description="Decode every page of multi-page TIFF/PDF scans and image globs.")
+    parser.add_argument("inputs", nargs="+", help="files, directories or glob patterns")
+    parser.add_argument("--symbologies", default=",".join(SYMBOLOGIES), help="comma-separated backends to run")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH)
+    parser.add_argument("--dedupe", action="store_true",
+                        help="for a page whose code region looks like a recent one, decode only that region and reuse "
+                             "the results if it yields the same payloads; look-alike labels still get a full decode")
+    args = parser.parse_args(argv)
+
+    symbologies = [s.strip() for s in args.symbologies.split(",") if s.strip()]
+    for source, index, image in stream_pages(args.inputs, args.prefetch):
+        record = {"path": source, "page": index + 1, "results": [], "error": None}
+        if image is None:
+            record["error"] = "unreadable"
+        else:
+            # Pages go to the decoders as arrays; ZXing gets an in-memory PNG
+            record["results"] = decode(image, symbologies, cache=False, dedupe=args.dedupe)
+        print(json.dumps(record, ensure_ascii=False))
+    if args.dedupe:
+        from near_duplicates import get_index
+
+        print(f"Near-duplicate pages: {get_index().decodes_avoided()} full decodes avoided", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
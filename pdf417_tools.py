@@ -0,0 +1,246 @@
+import io
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from decode_cache import cached
+from localize import decode_regions
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Pixels darker than the local mean minus this are ink
+THRESHOLD_OFFSET = 10
+# Skew below this is left alone, above MAX_SKEW it is not a skewed PDF417
+MIN_SKEW_DEGREES = 0.5
+MAX_SKEW_DEGREES = 20.0
+# Quiet zone kept around the cropped symbol, as a fraction of its size
+CROP_MARGIN = 0.05
+
+# Cleaning steps applied in order to the raw barcode text
+CLEAN_STEPS = (
+    (re.compile(r"[^A-Za-z0-9\s]"), ""),   # Remove symbols
+    (re.compile(r"[A-Za-z]{20,}"), ""),    # Remove long junk sequences
+    (re.compile(r"\s+"), " "),             # Normalize whitespace
+)
+
+# Declarative field schema: (field, pattern). The patterns are joined into
+# one alternation and the first match of each field wins. The numeric
+# fields are told apart by length and word boundaries, so a single scan
+# finds the same values as one search per field.
+FIELD_SCHEMA = (
+    ("id_number", r"\b\d{7,}\b"),
+    ("birth_year", r"\b(?:19|20)\d{2}\b"),
+    ("name", r"\b[A-Z]{3,}[A-Z]*[a-z]+\b"),
+    ("date", r"\b\d{6}\b"),
+)
+
+
+def compile_schema(schema=FIELD_SCHEMA):
+    return re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in schema))
+
+
+FIELD_RE = compile_schema()
+
+
+# -----------------------------
+# FUNCTION: Vectorized preprocessing
+# -----------------------------
+def to_gray(image):
+    """uint8 grayscale from a gray or BGR(A) array (ITU-R 601 weights)."""
+    if image.ndim == 2:
+        return image
+    weights = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+    return (image[..., :3].astype(np.float32) @ weights).round().astype(np.uint8)
+
+
+def adaptive_threshold(gray, block=None, offset=THRESHOLD_OFFSET):
+    """Binarize against the local mean of a ``block`` x ``block`` window (integral image)."""
+    h, w = gray.shape
+    block = block or max(15, (min(h, w) // 16) | 1)
+    r = block // 2
+    integral = np.zeros((h + 1, w + 1), dtype=np.int64)
+    integral[1:, 1:] = gray.cumsum(0, dtype=np.int64).cumsum(1)
+    y0, y1 = np.clip(np.arange(h) - r, 0, h), np.clip(np.arange(h) + r + 1, 0, h)
+    x0, x1 = np.clip(np.arange(w) - r, 0, w), np.clip(np.arange(w) + r + 1, 0, w)
+    sums = integral[np.ix_(y1, x1)] - integral[np.ix_(y0, x1)] - integral[np.ix_(y1, x0)] + integral[np.ix_(y0, x0)]
+    area = np.outer(y1 - y0, x1 - x0)
+    return np.where(gray.astype(np.int64) * area > sums - offset * area, 255, 0).astype(np.uint8)
+
+
+def skew_angle(binary, max_points=200000):
+    """Angle (degrees) of the principal axis of the ink, from second-order moments."""
+    ys, xs = np.nonzero(binary == 0)
+    if len(xs) < 50:
+        return 0.0
+    if len(xs) > max_points:
+        step = len(xs) // max_points + 1
+        ys, xs = ys[::step], xs[::step]
+    x = xs - xs.mean()
+    y = ys - ys.mean()
+    mu20, mu02, mu11 = (x * x).mean(), (y * y).mean(), (x * y).mean()
+    return float(np.degrees(0.5 * np.arctan2(2 * mu11, mu20 - mu02)))
+
+
+def _longest_run(mask):
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts, ends = np.nonzero(edges == 1)[0], np.nonzero(edges == -1)[0]
+    if not len(starts):
+        return None
+    i = int(np.argmax(ends - starts))
+    return int(starts[i]), int(ends[i])
+
+
+def symbol_box(binary):
+    """(x, y, w, h) of the densest block of ink rows and columns: the PDF417 symbol."""
+    ink = binary == 0
+    smooth = np.ones(5) / 5.0
+    rows = np.convolve(ink.mean(1), smooth, mode="same")
+    run = _longest_run(rows > 0.5 * rows.max()) if rows.max() > 0 else None
+    if run is None:
+        return None
+    y0, y1 = run
+    cols = np.convolve(ink[y0:y1].mean(0), smooth, mode="same")
+    run = _longest_run(cols > 0.1 * cols.max()) if cols.max() > 0 else None
+    if run is None:
+        return None
+    x0, x1 = run
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def preprocess(image, threshold=True, deskew=True, crop=True):
+    """Grayscale, adaptive threshold, deskew and crop to the symbol.
+
+    Returns (uint8 image for the decoder, info) where info records the
+    ``angle`` that was corrected and the ``box`` that was kept.
+    """
+    from PIL import Image
+
+    out = to_gray(image)
+    if threshold:
+        out = adaptive_threshold(out)
+    info = {"angle": 0.0, "box": None}
+    if deskew:
+        angle = skew_angle(out if threshold else adaptive_threshold(out))
+        if MIN_SKEW_DEGREES <= abs(angle) <= MAX_SKEW_DEGREES:
+            out = np.asarray(Image.fromarray(out).rotate(angle, resample=Image.NEAREST, expand=True, fillcolor=255))
+            info["angle"] = round(angle, 2)
+    if crop:
+        box = symbol_box(out if threshold else adaptive_threshold(out))
+        if box is not None:
+            x, y, w, h = box
+            mx, my = int(w * CROP_MARGIN) + 10, int(h * CROP_MARGIN) + 10
+            x0, y0 = max(0, x - mx), max(0, y - my)
+            out = out[y0:y + h + my, x0:x + w + mx]
+            info["box"] = [x0, y0, out.shape[1], out.shape[0]]
+    return np.ascontiguousarray(out), info
+
+
+# -----------------------------
+# FUNCTION: Decode
+# -----------------------------
+def decode_view(view):
+    """Decoded texts of the PDF417 symbols in a grayscale view.
+
+    The pure-Python decoder gets the small preprocessed crop first and the
+    untouched view only if that finds nothing.
+    """
+    from pdf417decoder import PDF417Decoder
+    from PIL import Image
+
+    prepared, _ = preprocess(view)
+    for candidate in (prepared, view):
+        if candidate.size == 0:
+            continue
+        decoder = PDF417Decoder(Image.fromarray(candidate))
+        if decoder.decode() > 0:
+            return [raw.decode("utf-8", errors="ignore") for raw in decoder.barcodes_data]
+    return []
+
+
+def clean_text(text):
+    for pattern, replacement in CLEAN_STEPS:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+def extract_fields(text, pattern=FIELD_RE):
+    """First value of every schema field in one pass over ``text`` (None when absent)."""
+    fields = dict.fromkeys(pattern.groupindex)
+    missing = len(fields)
+    for match in pattern.finditer(text):
+        name = match.lastgroup
+        if fields[name] is None:
+            fields[name] = match.group(name)
+            missing -= 1
+            if not missing:
+                break
+    return fields
+
+
+def parse_record(text, path=None, pattern=FIELD_RE):
+    clean = clean_text(text)
+    return {"path": path, "raw": text, "clean": clean, "fields": extract_fields(clean, pattern)}
+
+
+def _decode_texts(gray, stats=None):
+    # Likely symbol regions first, the full image only as a fallback
+    found, report = decode_regions(gray, lambda view: [{"text": text, "polygon": None} for text in decode_view(view)])
+    if stats is not None:
+        stats["localization"] = report
+    return [result["text"] for result in found]
+
+
+def decode_image(image, path=None, stats=None):
+    """Structured records for an in-memory image (e.g. one page of a scan, see page_source)."""
+    return [parse_record(text, path) for text in _decode_texts(to_gray(image), stats)]
+
+
+def decode_file(image_path, stats=None):
+    """Structured records (raw, clean, fields) for every PDF417 symbol in one image.
+
+    The decoded texts are cached by image content. Pass a dict as ``stats``
+    to receive the localization report.
+    """
+    from PIL import Image
+
+    with open(image_path, "rb") as f:
+        image_bytes = f.read()
+
+    def run_decoder():
+        return _decode_texts(np.asarray(Image.open(io.BytesIO(image_bytes)).convert("L")), stats)
+
+    texts = cached(image_bytes, "pdf417-roi-prep", run_decoder)
+    return [parse_record(text, image_path) for text in texts]
+
+
+def _decode_or_error(image_path):
+    try:
+        return decode_file(image_path)
+    except (OSError, ValueError) as e:
+        return [{"path": image_path, "error": str(e)}]
+
+
+def decode_batch(image_paths, workers=None):
+    """Decode many images; returns one list of records per input path, in order.
+
+    The decoder is pure Python, so images are spread over processes.
+    Unreadable images give a single record with an ``error``.
+    """
+    image_paths = list(image_paths)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(image_paths) <= 1:
+        return [_decode_or_error(path) for path in image_paths]
+    with ProcessPoolExecutor(max_workers=min(workers, len(image_paths))) as executor:
+        return list(executor.map(_decode_or_error, image_paths))
+
+
+if __name__ == "__main__":
+    import json
+
+    for records in decode_batch(sys.argv[1:]):
+        for record in records:
+            print(json.dumps(record, ensure_ascii=False))
@@ -0,0 +1,51 @@
+import cv2
+
+from localize import to_gray
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Longest side of each level tried before the full-resolution image
+DEFAULT_MAX_SIDES = (640, 1280)
+
+
+def pyramid_levels(image, max_sides=DEFAULT_MAX_SIDES):
+    """Yield (scale, gray) from the smallest level up to full resolution.
+
+    Levels that would not be smaller than the image are skipped; the last
+    level is always the full-resolution grayscale image itself.
+    """
+    gray = to_gray(image)
+    h, w = gray.shape[:2]
+    longest = max(h, w)
+    for side in sorted(max_sides):
+        if side >= longest:
+            break
+        scale = side / float(longest)
+        yield scale, cv2.resize(gray, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    yield 1.0, gray
+
+
+# -----------------------------
+# FUNCTION: Escalate on failure
+# -----------------------------
+def decode_pyramid(image, decode, max_sides=DEFAULT_MAX_SIDES):
+    """Decode the smallest grayscale level first, moving up only when nothing is found.
+
+    ``decode(gray)`` returns result dicts with a ``polygon`` in the
+    coordinates of the level it was given. Polygons are scaled back to the
+    original image, and every result records ``pyramid_level`` (0 is the
+    smallest) and ``pyramid_scale``. Returns (results, level_index) with
+    level_index None when no level decoded.
+    """
+    for level, (scale, gray) in enumerate(pyramid_levels(image, max_sides)):
+        results = decode(gray)
+        if not results:
+            continue
+        for result in results:
+            if result.get("polygon") is not None and scale != 1.0:
+                result["polygon"] = [[int(round(x / scale)), int(round(y / scale))] for x, y in result["polygon"]]
+            result["pyramid_level"] = level
+            result["pyramid_scale"] = round(scale, 4)
+        return results, level
+    return [], None
@@ -0,0 +1,77 @@
+import sys
+
+import cv2
+import numpy as np
+
+
+# -----------------------------
+# FUNCTION: Every QR in one pass
+# -----------------------------
+def detect_multi(detector, image):
+    """Decode every QR code in ``image`` with one detectAndDecodeMulti pass.
+
+    Returns a list of {text, symbology, polygon} dicts. Codes that were
+    located but could not be decoded are left out. If the multi detector
+    finds nothing, the single-code detector gets one try, since it copes
+    better with a lone code that fills most of the frame.
+    """
+    results = []
+    ok, texts, points, _ = detector.detectAndDecodeMulti(image)
+    if ok and points is not None:
+        for text, quad in zip(texts, points):
+            if text:
+                results.append({
+                    "text": text,
+                    "symbology": "QR_CODE",
+                    "polygon": np.asarray(quad).reshape(-1, 2).astype(int).tolist(),
+                })
+    if not results:
+        text, quad, _ = detector.detectAndDecode(image)
+        if text:
+            polygon = np.asarray(quad).reshape(-1, 2).astype(int).tolist() if quad is not None else None
+            results.append({"text": text, "symbology": "QR_CODE", "polygon": polygon})
+    return results
+
+
+# -----------------------------
+# CLASS: Detector reused across images
+# -----------------------------
+class QRBatchDecoder:
+    """Decodes many images with a single cv2.QRCodeDetector instance.
+
+    Not thread-safe (neither is the detector); use one per thread.
+    """
+
+    def __init__(self):
+        self.detector = cv2.QRCodeDetector()
+
+    def decode(self, image):
+        """All QR codes in a path or ndarray."""
+        if isinstance(image, str):
+            path = image
+            image = cv2.imread(path)
+            if image is None:
+                raise ValueError(f"Unable to read image '{path}'")
+        return detect_multi(self.detector, image)
+
+    def decode_many(self, images):
+        """Yield (image, results) for each path/ndarray in ``images``."""
+        for image in images:
+            try:
+                yield image, self.decode(image)
+            except ValueError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                yield image, []
+
+
+def decode_qr_batch(images):
+    """Decode a batch of images with one shared detector; returns a list of result lists."""
+    batch = QRBatchDecoder()
+    return [results for _, results in batch.decode_many(images)]
+
+
+if __name__ == "__main__":
+    for path, results in QRBatchDecoder().decode_many(sys.argv[1:]):
+        print(f"{path}: {len(results)} QR code(s)")
+        for result in results:
+            print(f"  {result['text']}  {result['polygon']}")
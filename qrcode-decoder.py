@@ -2,11 +2,27 @@ import cv2
 import numpy as np
 import sys
 
+from annotation_writer import annotate
+from decode_cache import cached
+from localize import decode_regions, format_report
+from pyramid import decode_pyramid
+from qr_multi import detect_multi
+
+# Streaming mode: qrcode-decoder.py --video <video file or camera index> [--show]
+if len(sys.argv) > 2 and sys.argv[1] == "--video":
+    from stream_decode import main as stream_main
+    sys.exit(stream_main([sys.argv[2], "--mode", "qr"] + sys.argv[3:]))
+
 # Allow passing the image path via CLI, fallback to default
 qr_image = sys.argv[1] if len(sys.argv) > 1 else "qrcode.png"
 
-# Read the image
-image = cv2.imread(qr_image)
+# Read the image (the raw bytes also key the decode cache)
+try:
+    with open(qr_image, "rb") as f:
+        image_bytes = f.read()
+except OSError:
+    image_bytes = b""
+image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR) if image_bytes else None
 
 if image is None:
     print(f"Error: Unable to read image '{qr_image}'")
@@ -16,42 +32,40 @@ if image is None:
 # Initialize QR code detector
 detector = cv2.QRCodeDetector()
 
-# Detect and decode the QR code
-data, points, _ = detector.detectAndDecode(image)
+def decode_view(view):
+    # Small grayscale copy first, larger levels only if nothing was found
+    found, level = decode_pyramid(view, lambda gray: detect_multi(detector, gray))
+    return found
+
+def detect_qr():
+    # Every QR code from a single detection pass per region: padded crops of
+    # likely code regions first, the full frame only as fallback
+    found, report = decode_regions(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), decode_view)
+    print(format_report(report))
+    for code in found:
+        print(f"Pyramid level {code['pyramid_level']} (scale {code['pyramid_scale']}) decoded: {code['text']}")
+    return found
+
+# Detect and decode the QR codes (skipped when this exact image was seen before)
+codes = cached(image_bytes, "qrcode-decoder-roi-pyramid", detect_qr)
 
-if data:
+if codes:
     print("=" * 60)
     print("QR Code Decoder Output:")
     print("=" * 60)
-    print(f"QR Code Data: {data}")
+    for i, code in enumerate(codes, 1):
+        print(f"QR Code {i} Data: {code['text']}")
     print("=" * 60)
-    
-    # Draw polygon around the QR code
-    if points is not None:
-        points = points.astype(int)
-        cv2.polylines(image, [points], True, (0, 255, 0), 2)
-        
-        # Annotate the decoded data beside the bounding box
-        # Get the top-left point for text placement
-        top_left = tuple(points[0][0])
-        cv2.putText(image, data, (top_left[0], top_left[1] - 10), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-    
-    # Save decoded text to file
+
+    # Save decoded text to file, one code per line
     with open("decoded_qrcode.txt", "w", encoding="utf-8") as f:
-        f.write(data)
+        f.write("\n".join(code["text"] for code in codes))
     print(f"Decoded text saved to: decoded_qrcode.txt")
     
-    # Save annotated image
-    annotated_image_path = "annotated_qrcode.png"
-    cv2.imwrite(annotated_image_path, image)
-    print(f"Annotated image saved as {annotated_image_path}")
-    
-    # Display the image
-    cv2.imshow("QR Code with Annotation", image)
-    print("Press any key to close the window.")
-    cv2.waitKey(0)
-    cv2.destroyAllWindows()
+    # Outline each QR code with its data beside it; the PNG is written in the
+    # background and the window is skipped when headless
+    annotate(image, [(code["polygon"], code["text"]) for code in codes], "annotated_qrcode.png",
+             "QR Code with Annotation")
 else:
     print("=" * 60)
     print("No QR code detected.")
@@ -0,0 +1,168 @@
+import argparse
+import atexit
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Segments a worker keeps mapped between tasks (tiles of one image reuse it)
+WORKER_ATTACH_CACHE = 4
+
+
+# -----------------------------
+# CLASS: Parent-owned segment
+# -----------------------------
+class SharedArray:
+    """A NumPy array copied once into multiprocessing.shared_memory.
+
+    The creating process owns the segment: it is unlinked on ``close()``,
+    on leaving the ``with`` block, or at interpreter exit, whatever happened
+    to the workers. Workers get the small, picklable ``handle`` and build a
+    zero-copy view with ``attach()``.
+    """
+
+    _live = {}
+    _live_lock = threading.Lock()
+
+    def __init__(self, array):
+        array = np.ascontiguousarray(array)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        self.array = np.ndarray(array.shape, dtype=array.dtype, buffer=self.shm.buf)
+        self.array[...] = array
+        self.handle = (self.shm.name, array.shape, array.dtype.str)
+        with SharedArray._live_lock:
+            SharedArray._live[self.shm.name] = self
+
+    def close(self):
+        with SharedArray._live_lock:
+            if SharedArray._live.pop(self.shm.name, None) is None:
+                return
+        # Drop our own view first so the buffer can be released
+        self.array = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # A caller still holds a view; unlinking below still frees the
+            # name, and the memory goes once that view is gone
+            pass
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @classmethod
+    def close_all(cls):
+        for segment in list(cls._live.values()):
+            segment.close()
+
+
+atexit.register(SharedArray.close_all)
+
+
+# -----------------------------
+# FUNCTION: Worker-side attach
+# -----------------------------
+_attached = OrderedDict()
+
+
+def _open_untracked(name):
+    # Only the owner may unlink; stop this process's resource tracker from
+    # removing the segment (or warning about it) when the worker exits
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+def attach(handle):
+    """Zero-copy read-only ndarray for a SharedArray handle (in a worker process).
+
+    Recently used segments stay mapped so all tiles of one image share a
+    single mapping per worker.
+    """
+    name, shape, dtype = handle
+    shm = _attached.get(name)
+    if shm is None:
+        shm = _open_untracked(name)
+        _attached[name] = shm
+        while len(_attached) > WORKER_ATTACH_CACHE:
+            _, old = _attached.popitem(last=False)
+            old.close()
+    else:
+        _attached.move_to_end(name)
+    view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    view.flags.writeable = False
+    return view
+
+
+# -----------------------------
+# BENCHMARK: pickling vs handles
+# -----------------------------
+def _task_pickled(array, tile):
+    x, y, w, h = tile
+    return float(array[y:y + h, x:x + w].mean())
+
+
+def _task_shared(handle, tile):
+    x, y, w, h = tile
+    return float(attach(handle)[y:y + h, x:x + w].mean())
+
+
+def benchmark(height=4000, width=6000, tiles=64, workers=None):
+    """Compare per-task IPC bytes and time for pickled arrays vs shared-memory handles."""
+    array = np.random.default_rng(0).integers(0, 255, (height, width), dtype=np.uint8)
+    th, tw = height // 8, width // 8
+    grid = [((i % 8) * tw, (i // 8 % 8) * th, tw, th) for i in range(tiles)]
+    workers = workers or os.cpu_count() or 1
+    report = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Warm the pool up so process start-up is not counted
+        list(executor.map(abs, range(workers)))
+
+        start = time.perf_counter()
+        list(executor.map(_task_pickled, [array] * tiles, grid))
+        elapsed = time.perf_counter() - start
+        report["pickle"] = {
+            "ipc_bytes_per_task": len(pickle.dumps((array, grid[0]))),
+            "ms_per_task": round(elapsed * 1000 / tiles, 3),
+        }
+
+        with SharedArray(array) as segment:
+            start = time.perf_counter()
+            list(executor.map(_task_shared, [segment.handle] * tiles, grid))
+            elapsed = time.perf_counter() - start
+            report["shared_memory"] = {
+                "ipc_bytes_per_task": len(pickle.dumps((segment.handle, grid[0]))),
+                "ms_per_task": round(elapsed * 1000 / tiles, 3),
+            }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark shared-memory image passing against pickling.")
+    parser.add_argument("--height", type=int, default=4000)
+    parser.add_argument("--width", type=int, default=6000)
+    parser.add_argument("--tiles", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    result = benchmark(args.height, args.width, args.tiles, args.workers)
+    for mode, numbers in result.items():
+        print(f"{mode:>14}: {numbers['ipc_bytes_per_task']:>12,} IPC bytes/task, {numbers['ms_per_task']:>8.3f} ms/task")
+    sys.exit(0)
@@ -0,0 +1,319 @@
+import argparse
+import queue
+import sys
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from near_duplicates import NearDuplicateIndex, code_hash, without_polygons
+from qr_multi import detect_multi
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Frames waiting for the decoder; older frames are dropped past this
+DEFAULT_QUEUE_SIZE = 4
+# Mean absolute difference (0-255) on a small grayscale thumbnail below
+# which a frame is treated as "same scene" and the previous result reused
+DEFAULT_MOTION_THRESHOLD = 2.0
+# Frames a code stays tracked after it was last seen
+DEFAULT_TRACK_TTL = 30
+
+
+# -----------------------------
+# CLASS: Capture thread
+# -----------------------------
+class FrameReader(threading.Thread):
+    """Reads frames from cv2.VideoCapture into a bounded queue.
+
+    With ``drop=True`` (live cameras) the oldest queued frame is discarded
+    when the decoder falls behind, so latency stays bounded. With
+    ``drop=False`` (files) the reader waits instead and every frame is
+    decoded.
+    """
+
+    def __init__(self, source, queue_size=DEFAULT_QUEUE_SIZE, drop=True):
+        super().__init__(daemon=True)
+        self.capture = cv2.VideoCapture(source)
+        if not self.capture.isOpened():
+            raise ValueError(f"Unable to open video source {source!r}")
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.drop = drop
+        self.read_count = 0
+        self.dropped = 0
+        self._stopping = threading.Event()
+
+    def run(self):
+        try:
+            self._read_frames()
+        finally:
+            # Also after a failed read, so run_stream never waits on a dead reader
+            try:
+                self.capture.release()
+            finally:
+                self._end()
+
+    def _read_frames(self):
+        index = 0
+        while not self._stopping.is_set():
+            ok, frame = self.capture.read()
+            if not ok:
+                break
+            self.read_count += 1
+            item = (index, time.perf_counter(), frame)
+            index += 1
+            if self.drop:
+                while True:
+                    try:
+                        self.frames.put_nowait(item)
+                        break
+                    except queue.Full:
+                        try:
+                            self.frames.get_nowait()
+                            self.dropped += 1
+                        except queue.Empty:
+                            pass
+            else:
+                while not self._stopping.is_set():
+                    try:
+                        self.frames.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+
+    def _end(self):
+        # End-of-stream marker: wait for room while the consumer is reading,
+        # but never block once stop() was called and nobody reads any more
+        while True:
+            try:
+                self.frames.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                if self._stopping.is_set():
+                    break
+
+    def stop(self):
+        self._stopping.set()
+
+
+# -----------------------------
+# CLASS: Cross-frame tracking
+# -----------------------------
+class CodeTracker:
+    """Remembers codes across frames so each one is reported once.
+
+    Also keeps a small grayscale thumbnail of the last decoded frame: when
+    the next frame barely differs, the decoder is skipped and the tracked
+    codes are carried over.
+    """
+
+    def __init__(self, motion_threshold=DEFAULT_MOTION_THRESHOLD, ttl=DEFAULT_TRACK_TTL):
+        self.motion_threshold = motion_threshold
+        self.ttl = ttl
+        self.codes = {}
+        self._thumb = None
+
+    @staticmethod
+    def thumbnail(gray):
+        return cv2.resize(gray, (64, 48), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def unchanged(self, thumb):
+        if self._thumb is None or not self.codes:
+            return False
+        return float(np.mean(np.abs(thumb - self._thumb))) < self.motion_threshold
+
+    def update(self, frame_index, results, thumb):
+        """Record this frame's results; returns the codes not seen before."""
+        self._thumb = thumb
+        new = []
+        for result in results:
+            text = result["text"]
+            if text not in self.codes:
+                new.append(result)
+            self.codes[text] = {"polygon": result["polygon"], "last_seen": frame_index, "symbology": result["symbology"]}
+        self.expire(frame_index)
+        return new
+
+    def touch(self, frame_index):
+        for code in self.codes.values():
+            code["last_seen"] = frame_index
+
+    def expire(self, frame_index):
+        for text in [t for t, c in self.codes.items() if frame_index - c["last_seen"] > self.ttl]:
+            del self.codes[text]
+
+    def current(self):
+        return [{"text": t, "polygon": c["polygon"], "symbology": c["symbology"]} for t, c in self.codes.items()]
+
+
+# -----------------------------
+# FUNCTION: Per-frame decoders
+# -----------------------------
+def make_decoder(mode):
+    """Return decode(gray) -> list of {text, symbology, polygon} for a mode."""
+    if mode == "qr":
+        detector = cv2.QRCodeDetector()
+
+        def decode_qr(gray):
+            return detect_multi(detector, gray)
+
+        return decode_qr
+
+    if mode == "barcode":
+        from pyzbar.pyzbar import decode as pyzbar_decode
+
+        def decode_barcode(gray):
+            return [
+                {
+                    "text": b.data.decode("utf-8", errors="replace"),
+                    "symbology": b.type,
+                    "polygon": [[p.x, p.y] for p in b.polygon],
+                }
+                for b in pyzbar_decode(gray)
+            ]
+
+        return decode_barcode
+
+    raise ValueError(f"Unknown stream mode: {mode}")
+
+
+def annotate(frame, codes):
+    for code in codes:
+        if code["polygon"]:
+            pts = np.array(code["polygon"], dtype=np.int32).reshape((-1, 1, 2))
+            cv2.polylines(frame, [pts], True, (0, 255, 0), 2)
+            x, y = code["polygon"][0]
+            cv2.putText(frame, code["text"][:50], (int(x), int(y) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+    return frame
+
+
+# -----------------------------
+# FUNCTION: Stream loop
+# -----------------------------
+def run_stream(source, mode="qr", queue_size=DEFAULT_QUEUE_SIZE, drop=None, show=False,
+               motion_threshold=DEFAULT_MOTION_THRESHOLD, on_code=None, max_frames=None, dedupe=False):
+    """Decode a video file or camera and return a stats dict.
+
+    ``source`` is a file path or a camera index. ``on_code(frame_index,
+    result)`` is called once for every newly seen code. Frames are dropped
+    only when ``drop`` is true (default: cameras yes, files no).
+
+    With ``dedupe`` (True, or your own NearDuplicateIndex) a frame that
+    moved but whose code region hashes close to a recently decoded one (a
+    label coming back into view) reuses that frame's codes without their
+    polygons. Off by default: labels printed from one template can still
+    collide, and the reused text is never verified against this frame.
+    """
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    if drop is None:
+        drop = isinstance(source, int)
+
+    decoder = make_decoder(mode)
+    tracker = CodeTracker(motion_threshold)
+    index_of_recent = (NearDuplicateIndex() if dedupe is True else dedupe) or None
+    reader = FrameReader(source, queue_size, drop)
+    reader.start()
+
+    stats = {"frames": 0, "decoded_frames": 0, "skipped_frames": 0, "near_duplicate_frames": 0, "codes": 0}
+    # Recent latencies only, so long-running streams use constant memory
+    latencies = deque(maxlen=10000)
+    start = time.perf_counter()
+    try:
+        while True:
+            item = reader.frames.get()
+            if item is None:
+                break
+            index, captured_at, frame = item
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            thumb = tracker.thumbnail(gray)
+            if tracker.unchanged(thumb):
+                # Same scene as the last decoded frame: don't decode again
+                tracker.touch(index)
+                stats["skipped_frames"] += 1
+            else:
+                results = None
+                if index_of_recent is not None:
+                    frame_hash = code_hash(gray)
+                    results, _ = index_of_recent.get(frame_hash, mode)
+                if results is not None:
+                    # Text only: polygons from another frame would be drawn in the wrong place
+                    results = without_polygons(results)
+                    stats["near_duplicate_frames"] += 1
+                else:
+                    results = decoder(gray)
+                    stats["decoded_frames"] += 1
+                    if index_of_recent is not None:
+                        index_of_recent.put(frame_hash, results, mode)
+                for result in tracker.update(index, results, thumb):
+                    stats["codes"] += 1
+                    if on_code:
+                        on_code(index, result)
+            stats["frames"] += 1
+            latencies.append((time.perf_counter() - captured_at) * 1000)
+
+            if show:
+                cv2.imshow("Stream", annotate(frame, tracker.current()))
+                if cv2.waitKey(1) & 0xFF == ord("q"):
+                    break
+            if max_frames and stats["frames"] >= max_frames:
+                break
+    finally:
+        reader.stop()
+        # The reader only finishes its current read; this releases the capture
+        reader.join(timeout=5)
+        if show:
+            cv2.destroyAllWindows()
+
+    elapsed = time.perf_counter() - start
+    stats["dropped_frames"] = reader.dropped
+    stats["seconds"] = round(elapsed, 3)
+    stats["fps"] = round(stats["frames"] / elapsed, 2) if elapsed > 0 else 0.0
+    if latencies:
+        ordered = sorted(latencies)
+        stats["latency_ms_mean"] = round(sum(ordered) / len(ordered), 2)
+        stats["latency_ms_p50"] = round(ordered[len(ordered) // 2], 2)
+        stats["latency_ms_p95"] = round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2)
+    return stats
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode QR codes or 1D barcodes from a video file or camera.")
+    parser.add_argument("source", help="video file path or camera index (e.g. 0)")
+    parser.add_argument("--mode", choices=["qr", "barcode"], default="qr")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument("--drop", dest="drop", action="store_true", default=None, help="drop frames when decoding falls behind")
+    parser.add_argument("--no-drop", dest="drop", action="store_false", help="decode every frame")
+    parser.add_argument("--motion-threshold", type=float, default=DEFAULT_MOTION_THRESHOLD)
+    parser.add_argument("--show", action="store_true", help="display annotated frames (press q to quit)")
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--dedupe", action="store_true",
+                        help="reuse the codes of a recent frame whose code region looks the same, without re-decoding; "
+                             "labels printed from one template can collide and be reported with each other's text")
+    args = parser.parse_args(argv)
+
+    def report(frame_index, result):
+        print(f"[frame {frame_index}] {result['symbology']}: {result['text']}")
+
+    try:
+        stats = run_stream(args.source, args.mode, args.queue_size, args.drop, args.show,
+                           args.motion_threshold, report, args.max_frames, args.dedupe)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+
+    print("=" * 60)
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from localize import propose_regions, to_gray
+from metrics import incr, span
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Longest side of the copy the classifier looks at
+DEFAULT_MAX_SIDE = 640
+# Symbologies scoring below this do not move their backend up the order
+DEFAULT_MIN_SCORE = 0.2
+# Backend that decodes each symbology (see unified_decoder.BACKENDS)
+BACKEND_FOR = {
+    "1d": "barcode",
+    "qr": "qr",
+    "pdf417": "pdf417",
+    "aztec": "zxing",
+    "datamatrix": "zxing",
+    "maxicode": "zxing",
+}
+# Order for backends without evidence: cheapest first, the JVM last
+FALLBACK_ORDER = ("barcode", "qr", "pdf417", "zxing")
+
+
+def _prepare(image, max_side):
+    gray = to_gray(image)
+    h, w = gray.shape[:2]
+    scale = min(1.0, max_side / float(max(h, w)))
+    if scale < 1.0:
+        gray = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return gray, ink
+
+
+# -----------------------------
+# FUNCTION: Finder patterns
+# -----------------------------
+def _chain_depth(i, hierarchy):
+    # Levels of single-child nesting below contour i (rings inside rings)
+    depth = 0
+    child = hierarchy[i][2]
+    while child != -1 and hierarchy[child][0] == -1:
+        depth += 1
+        child = hierarchy[child][2]
+    return depth
+
+
+def finder_patterns(ink, min_area=30):
+    """Concentric nested contours: QR finders, the Aztec and MaxiCode bullseyes, and L shapes.
+
+    Returns (chains, l_shapes). Each chain is {depth, round, area, box};
+    ``round`` tells circular rings (MaxiCode) from square ones. L shapes
+    are candidate Data Matrix finders, as bounding boxes.
+    """
+    contours, hierarchy = cv2.findContours(ink, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    if hierarchy is None:
+        return [], []
+    hierarchy = hierarchy[0]
+    areas = [cv2.contourArea(c) for c in contours]
+    used = set()
+    chains = []
+    l_shapes = []
+    # Largest first, so the rings inside a pattern are not counted again
+    for i in sorted(range(len(contours)), key=lambda k: -areas[k]):
+        if i in used or areas[i] < min_area:
+            continue
+        contour = contours[i]
+        perimeter = cv2.arcLength(contour, True)
+        vertices = len(cv2.approxPolyDP(contour, 0.04 * perimeter, True))
+        x, y, w, h = cv2.boundingRect(contour)
+        depth = _chain_depth(i, hierarchy)
+        if depth >= 2 and 0.6 <= w / float(h) <= 1.6:
+            child = hierarchy[i][2]
+            while child != -1:
+                used.add(child)
+                child = hierarchy[child][2]
+            chains.append({"depth": depth, "round": vertices > 6, "area": areas[i], "box": (x, y, w, h)})
+        elif vertices == 6 and min(w, h) >= 12 and 0.05 <= areas[i] / float(w * h) <= 0.4:
+            l_shapes.append((x, y, w, h))
+    return chains, l_shapes
+
+
+def _side_profile(ink, box):
+    # Ink fraction and number of ink/paper transitions along each side of box
+    x, y, w, h = box
+    t = max(1, int(round(min(w, h) * 0.04)))
+    strips = {
+        "top": ink[y:y + t, x:x + w].mean(0),
+        "bottom": ink[y + h - t:y + h, x:x + w].mean(0),
+        "left": ink[y:y + h, x:x + t].mean(1),
+        "right": ink[y:y + h, x + w - t:x + w].mean(1),
+    }
+    profile = {}
+    for side, values in strips.items():
+        on = values > 127
+        profile[side] = (float(on.mean()) if on.size else 0.0, int(np.count_nonzero(on[1:] != on[:-1])))
+    return profile
+
+
+def datamatrix_score(ink, l_shapes):
+    """1.0 for an L of two solid sides with dotted timing sides opposite it, 0.5 for a bare L."""
+    best = 0.0
+    for box in l_shapes:
+        p = _side_profile(ink, box)
+        for solid_a, solid_b, dot_a, dot_b in (("left", "bottom", "top", "right"), ("left", "top", "bottom", "right"),
+                                               ("right", "bottom", "top", "left"), ("right", "top", "bottom", "left")):
+            if p[solid_a][0] > 0.85 and p[solid_b][0] > 0.85:
+                timing = all(0.25 <= p[s][0] <= 0.75 and p[s][1] >= 6 for s in (dot_a, dot_b))
+                best = max(best, 1.0 if timing else 0.5)
+    return best
+
+
+# -----------------------------
+# FUNCTION: Bars
+# -----------------------------
+def bar_scores(gray, regions):
+    """(1d, pdf417) scores from the densest region: bar orientation and column structure.
+
+    Both are stacks of parallel bars (high gradient coherence). In a 1D
+    code nearly every column is solid ink or solid paper from top to
+    bottom; in PDF417 only the start/stop patterns at both ends are, the
+    codeword rows in between vary down each column.
+    """
+    if not regions:
+        return 0.0, 0.0
+    x, y, w, h = regions[0]
+    crop = gray[y:y + h, x:x + w]
+    if crop.size < 400:
+        return 0.0, 0.0
+    gx = cv2.Sobel(crop, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(crop, cv2.CV_32F, 0, 1, ksize=3)
+    jxx, jyy, jxy = float((gx * gx).sum()), float((gy * gy).sum()), float((gx * gy).sum())
+    coherence = np.sqrt((jxx - jyy) ** 2 + 4 * jxy ** 2) / (jxx + jyy + 1e-9)
+    gate = float(np.clip((coherence - 0.3) / 0.4, 0.0, 1.0))
+    if gate == 0.0:
+        return 0.0, 0.0
+    if jyy > jxx:
+        # Horizontal bars: turn them upright
+        crop = crop.T
+    _, ink = cv2.threshold(crop, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    fraction = ink.mean(0) / 255.0
+    inked = np.nonzero(fraction > 0.05)[0]
+    if len(inked) < 10:
+        return 0.0, 0.0
+    span_cols = fraction[inked[0]:inked[-1] + 1]
+    uniform = (span_cols > 0.8) | (span_cols < 0.2)
+    uniform_ratio = float(uniform.mean())
+    edge = max(1, len(span_cols) // 8)
+    solid = span_cols > 0.8
+    ends = (solid[:edge].mean() + solid[-edge:].mean()) / 2.0
+    middle = solid[edge:-edge].mean() if len(span_cols) > 2 * edge else 0.0
+    pdf417 = gate * (1.0 - uniform_ratio) * float(np.clip((ends - middle) * 4.0, 0.0, 1.0))
+    return round(gate * uniform_ratio, 3), round(pdf417, 3)
+
+
+# -----------------------------
+# FUNCTION: Classify and rank
+# -----------------------------
+def classify(image, max_side=DEFAULT_MAX_SIDE):
+    """Structural evidence (0-1) for each symbology, from one small grayscale copy."""
+    gray, ink = _prepare(image, max_side)
+    chains, l_shapes = finder_patterns(ink)
+    squares = [c for c in chains if not c["round"]]
+    qr_finders = [c for c in squares if c["depth"] in (2, 3)]
+    scores = {
+        "qr": round(min(1.0, len(qr_finders) / 3.0), 3),
+        "aztec": 1.0 if any(c["depth"] >= 4 for c in squares) else 0.0,
+        "maxicode": 1.0 if any(c["round"] and c["depth"] >= 4 for c in chains) else 0.0,
+        "datamatrix": datamatrix_score(ink, l_shapes),
+    }
+    scores["1d"], scores["pdf417"] = bar_scores(gray, propose_regions(gray, max_side=max_side))
+    return scores
+
+
+def rank_backends(scores, min_score=DEFAULT_MIN_SCORE, include_unranked=True):
+    """Backends ordered by the best score of the symbologies they decode.
+
+    Backends without evidence follow in FALLBACK_ORDER (cheap ones first),
+    unless ``include_unranked`` is False.
+    """
+    order = []
+    for symbology, score in sorted(scores.items(), key=lambda item: -item[1]):
+        backend = BACKEND_FOR[symbology]
+        if score >= min_score and backend not in order:
+            order.append(backend)
+    if include_unranked:
+        order += [backend for backend in FALLBACK_ORDER if backend not in order]
+    return order
+
+
+def dispatch(image, include_unranked=True, cache=True, min_score=DEFAULT_MIN_SCORE, dedupe=False):
+    """Classify, then run the backends in ranked order and stop at the first success.
+
+    Returns (results, info) where info has the ``scores``, the backend
+    ``order`` and ``classify_ms``. ``cache`` and ``dedupe`` are passed to
+    unified_decoder.decode.
+    """
+    from unified_decoder import decode, load_image
+
+    shared = load_image(image)
+    start = time.perf_counter()
+    with span("classify"):
+        scores = classify(shared.gray)
+    classify_ms = round((time.perf_counter() - start) * 1000, 3)
+    order = rank_backends(scores, min_score, include_unranked)
+    results = decode(shared, order, stop_at_first=True, cache=cache, dedupe=dedupe)
+    if results:
+        incr("dispatch_first_backend_hit" if results[0]["backend"] == order[0] else "dispatch_later_backend_hit")
+    return results, {"scores": scores, "order": order, "classify_ms": classify_ms}
+
+
+if __name__ == "__main__":
+    import json
+
+    if len(sys.argv) < 2:
+        print(f"Usage: {sys.argv[0]} IMAGE [IMAGE ...]")
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        results, info = dispatch(path)
+        print(json.dumps({"path": path, **info, "results": results}, ensure_ascii=False))
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("numpy")
+
+import decode_service  # noqa: E402
+import metrics  # noqa: E402
+from decode_service import DecodeService, make_result, request  # noqa: E402
+
+
+def run_with_server(service, client):
+    """Start ``service`` on an ephemeral port, run ``client(port)``, then shut everything down."""
+
+    async def main():
+        await service.start()
+        server = await asyncio.start_server(service.handle_connection, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await client(port)
+        finally:
+            server.close()
+            await server.wait_closed()
+            await service.stop()
+
+    return asyncio.run(main())
+
+
+def test_decode_returns_results(monkeypatch):
+    calls = []
+
+    def fake_decode(data, symbologies, stop_at_first=False, cache=False):
+        calls.append((data, tuple(symbologies)))
+        return [make_result("hello", "QRCODE", [(0, 0), (9, 0), (9, 9), (0, 9)], "qr")]
+
+    monkeypatch.setattr(decode_service, "decode", fake_decode)
+
+    async def client(port):
+        return await request("POST", "/decode?symbologies=qr", b"image bytes", port=port)
+
+    status, payload = run_with_server(DecodeService(threads=1, cache=False), client)
+    assert status == 200
+    assert [result["text"] for result in payload["results"]] == ["hello"]
+    assert calls == [(b"image bytes", ("qr",))]
+
+
+def test_full_queue_answers_503(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking_decode(data, symbologies, stop_at_first=False, cache=False):
+        started.set()
+        release.wait(5)
+        return []
+
+    monkeypatch.setattr(decode_service, "decode", blocking_decode)
+
+    async def client(port):
+        loop = asyncio.get_running_loop()
+        # The only consumer is busy with the first request and the second fills the queue
+        busy = asyncio.ensure_future(request("POST", "/decode?symbologies=qr", b"1", port=port))
+        await loop.run_in_executor(None, started.wait, 5)
+        queued = asyncio.ensure_future(request("POST", "/decode?symbologies=qr", b"2", port=port))
+        while service.stats()["queued"] < 1:
+            await asyncio.sleep(0.01)
+        rejected = await request("POST", "/decode?symbologies=qr", b"3", port=port)
+        release.set()
+        return rejected, await busy, await queued
+
+    service = DecodeService(queue_size=1, threads=1, cache=False)
+    rejected, busy, queued = run_with_server(service, client)
+    assert rejected[0] == 503
+    assert "queue full" in rejected[1]["error"]
+    assert busy[0] == 200 and queued[0] == 200
+    assert service.counters["rejected"] == 1
+
+
+def test_metrics_endpoint_serves_prometheus_text(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    metrics.reset()
+    metrics.incr("service_test")
+
+    async def client(port):
+        # /metrics is plain text, so read the raw response instead of request()
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return response.decode("utf-8")
+
+    try:
+        response = run_with_server(DecodeService(threads=1, cache=False), client)
+    finally:
+        metrics.reset()
+    head, _, body = response.partition("\r\n\r\n")
+    assert head.startswith("HTTP/1.1 200")
+    assert "Content-Type: text/plain" in head
+    assert "_service_test_total 1" in body
@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+import stream_decode  # noqa: E402
+from stream_decode import FrameReader, run_stream  # noqa: E402
+
+WIDTH, HEIGHT = 320, 240
+# Five frames of code A, five of B, then A comes back into view
+SEQUENCE = ["A"] * 5 + ["B"] * 5 + ["A"] * 5
+
+
+def qr_frame(text):
+    if not hasattr(cv2, "QRCodeEncoder"):
+        pytest.skip("OpenCV build without QRCodeEncoder")
+    code = cv2.QRCodeEncoder.create().encode(text)
+    code = cv2.resize(code, None, fx=6, fy=6, interpolation=cv2.INTER_NEAREST)
+    frame = np.full((HEIGHT, WIDTH), 255, dtype=np.uint8)
+    h, w = code.shape[:2]
+    y, x = (HEIGHT - h) // 2, (WIDTH - w) // 2
+    frame[y:y + h, x:x + w] = code
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+
+@pytest.fixture
+def video(tmp_path):
+    """Short synthetic MJPG video of SEQUENCE, one QR code per frame."""
+    path = str(tmp_path / "codes.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (WIDTH, HEIGHT))
+    if not writer.isOpened():
+        pytest.skip("OpenCV cannot write MJPG video here")
+    frames = {text: qr_frame(text) for text in set(SEQUENCE)}
+    for text in SEQUENCE:
+        writer.write(frames[text])
+    writer.release()
+    capture = cv2.VideoCapture(path)
+    readable = capture.isOpened()
+    capture.release()
+    if not readable:
+        pytest.skip("OpenCV cannot read MJPG video here")
+    return path
+
+
+def test_file_decodes_every_frame_without_dropping(video):
+    seen = []
+    stats = run_stream(video, "qr", drop=False, on_code=lambda index, result: seen.append(result["text"]))
+    assert stats["frames"] == len(SEQUENCE)
+    assert stats["dropped_frames"] == 0
+    # One decode per change of scene; the unchanged frames in between are skipped
+    assert stats["decoded_frames"] == 3
+    assert stats["skipped_frames"] == len(SEQUENCE) - 3
+    assert stats["near_duplicate_frames"] == 0
+    assert seen == ["A", "B"]
+
+
+def test_dedupe_reuses_a_code_coming_back_into_view(video):
+    stats = run_stream(video, "qr", drop=False, dedupe=True)
+    assert stats["frames"] == len(SEQUENCE)
+    assert stats["near_duplicate_frames"] == 1
+    assert stats["decoded_frames"] == 2
+
+
+def test_slow_decoder_drops_frames_when_dropping(video, monkeypatch):
+    make_decoder = stream_decode.make_decoder
+
+    def slow_decoder(mode):
+        decode = make_decoder(mode)
+
+        def slow(gray):
+            time.sleep(0.2)
+            return decode(gray)
+
+        return slow
+
+    monkeypatch.setattr(stream_decode, "make_decoder", slow_decoder)
+    stats = run_stream(video, "qr", queue_size=1, drop=True)
+    assert stats["dropped_frames"] > 0
+    assert stats["frames"] + stats["dropped_frames"] == len(SEQUENCE)
+
+
+def test_reader_error_still_ends_the_stream(video):
+    class BrokenCapture:
+        def read(self):
+            raise RuntimeError("camera unplugged")
+
+        def release(self):
+            pass
+
+    reader = FrameReader(video, queue_size=1, drop=False)
+    reader.capture.release()
+    reader.capture = BrokenCapture()
+    with pytest.raises(RuntimeError):
+        reader.run()
+    assert reader.frames.get_nowait() is None
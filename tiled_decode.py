@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from localize import offset_polygon
+from metrics import incr
+from shm_images import SharedArray, attach
+from unified_decoder import BACKENDS, SharedImage, load_image
+from zxing_worker import ZXingWorkerError
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+DEFAULT_TILE_SIZE = 2048
+# Must be larger than the biggest code so every code fits whole in some tile
+DEFAULT_OVERLAP = 384
+# Boxes of the same payload overlapping more than this are one code
+DEFAULT_IOU_THRESHOLD = 0.3
+
+
+def tile_grid(height, width, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_OVERLAP):
+    """Overlapping (x, y, w, h) tiles covering a height x width image."""
+    if tile_size <= 0 or not 0 <= overlap < tile_size:
+        raise ValueError(f"overlap ({overlap}) must be at least 0 and smaller than tile_size ({tile_size})")
+    step = tile_size - overlap
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        points = list(range(0, length - tile_size, step))
+        points.append(length - tile_size)
+        return points
+
+    return [
+        (x, y, min(tile_size, width - x), min(tile_size, height - y))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def _bbox(polygon):
+    xs = [p[0] for p in polygon]
+    ys = [p[1] for p in polygon]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _iou(a, b):
+    ax0, ay0, ax1, ay1 = a
+    bx0, by0, bx1, by1 = b
+    iw = max(0, min(ax1, bx1) - max(ax0, bx0))
+    ih = max(0, min(ay1, by1) - max(ay0, by0))
+    inter = iw * ih
+    if inter == 0:
+        return 0.0
+    area_a = (ax1 - ax0) * (ay1 - ay0)
+    area_b = (bx1 - bx0) * (by1 - by0)
+    # A code cut by a tile edge sits inside the complete one: count containment too
+    return max(inter / float(area_a + area_b - inter), inter / float(max(1, min(area_a, area_b))))
+
+
+def merge_results(results, iou_threshold=DEFAULT_IOU_THRESHOLD):
+    """Deduplicate codes found in several tiles by payload and polygon overlap.
+
+    The copy with the largest polygon (the least truncated) is kept, so two
+    identical labels in different places are still reported twice.
+    """
+    merged = []
+    for result in sorted(results, key=lambda r: -_area(r)):
+        duplicate = False
+        for kept in merged:
+            if kept["text"] != result["text"] or kept["symbology"] != result["symbology"]:
+                continue
+            if kept["polygon"] is None or result["polygon"] is None:
+                duplicate = True
+            elif _iou(_bbox(kept["polygon"]), _bbox(result["polygon"])) >= iou_threshold:
+                duplicate = True
+            if duplicate:
+                break
+        if not duplicate:
+            merged.append(result)
+    return merged
+
+
+def _area(result):
+    if not result.get("polygon"):
+        return 0
+    x0, y0, x1, y1 = _bbox(result["polygon"])
+    return (x1 - x0) * (y1 - y0)
+
+
+def _decode_view(gray, tile, symbologies, source):
+    x, y, w, h = tile
+    part = SharedImage(gray[y:y + h, x:x + w], source)
+    found = []
+    for name in symbologies:
+        try:
+            results = BACKENDS[name](part)
+        except ImportError:
+            continue
+        except ZXingWorkerError as e:
+            # One failed or timed-out tile must not abort the whole scan
+            incr("decode_failures", stage="tile", backend=name)
+            print(f"Warning: {name} backend failed on tile {tile} ({e})", file=sys.stderr)
+            continue
+        for result in results:
+            result["polygon"] = offset_polygon(result["polygon"], x, y)
+            result["tile"] = [x, y, w, h]
+        found.extend(results)
+    return found
+
+
+def _decode_shared_tile(handle, tile, symbologies, source):
+    # Worker process: only the small handle was pickled; the tile is a view
+    # of the parent's shared-memory buffer
+    return _decode_view(attach(handle), tile, symbologies, source)
+
+
+# -----------------------------
+# FUNCTION: Tiled decode
+# -----------------------------
+def decode_tiled(image, symbologies=("barcode", "qr"), tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_OVERLAP,
+                 workers=None, iou_threshold=DEFAULT_IOU_THRESHOLD, stats=None, processes=False):
+    """Decode a very large image tile by tile in parallel.
+
+    Tiles are NumPy views of one shared grayscale buffer, so no pixels are
+    copied. By default a thread pool is used (OpenCV, zbar and the ZXing
+    worker pipes all release the GIL). With ``processes=True`` the buffer
+    is placed in shared memory once and worker processes receive only a
+    small handle (see shm_images). Results are mapped back to full-image
+    coordinates and merged with merge_results.
+    """
+    shared = load_image(image)
+    gray = shared.gray
+    tiles = tile_grid(gray.shape[0], gray.shape[1], tile_size, overlap)
+    workers = workers or os.cpu_count() or 1
+    n = len(tiles)
+
+    start = time.perf_counter()
+    if processes:
+        with SharedArray(gray) as segment, ProcessPoolExecutor(max_workers=workers) as executor:
+            found = executor.map(_decode_shared_tile, [segment.handle] * n, tiles, [symbologies] * n, [shared.source] * n)
+            raw = [result for results in found for result in results]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            found = executor.map(_decode_view, [gray] * n, tiles, [symbologies] * n, [shared.source] * n)
+            raw = [result for results in found for result in results]
+    merged = merge_results(raw, iou_threshold)
+    if stats is not None:
+        stats.update({
+            "tiles": len(tiles),
+            "raw_results": len(raw),
+            "merged_results": len(merged),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+        })
+    return merged
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode a very large scan in overlapping tiles.")
+    parser.add_argument("image")
+    parser.add_argument("--symbologies", default="barcode,qr", help="comma-separated backends to run per tile")
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE)
+    parser.add_argument("--overlap", type=int, default=DEFAULT_OVERLAP)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--processes", action="store_true", help="use worker processes with shared-memory tiles")
+    args = parser.parse_args(argv)
+    if args.tile_size <= 0 or not 0 <= args.overlap < args.tile_size:
+        parser.error("--overlap must be at least 0 and smaller than --tile-size")
+
+    stats = {}
+    symbologies = [s.strip() for s in args.symbologies.split(",") if s.strip()]
+    for result in decode_tiled(args.image, symbologies, args.tile_size, args.overlap, args.workers,
+                               stats=stats, processes=args.processes):
+        print(json.dumps(result, ensure_ascii=False))
+    print(
+        f"{stats['tiles']} tiles, {stats['raw_results']} raw -> {stats['merged_results']} codes "
+        f"in {stats['elapsed_ms']:.0f} ms",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from decode_cache import cache_key, get_cache
+from decode_scheduler import GLOBAL_SCOPE, run_backends, source_scope
+from localize import decode_regions, propose_regions
+from metrics import incr, span
+from near_duplicates import code_hash, code_region, get_index
+from pyramid import decode_pyramid
+from qr_multi import detect_multi
+from zxing_batch import parse_output
+from zxing_worker import ZXingWorkerError, ZXingWorkerTimeout, get_pool, image_request
+
+# Backends in the order decode() runs them by default
+SYMBOLOGIES = ("qr", "barcode", "pdf417", "zxing")
+
+# Part of every cache key; bump when a backend's results change shape or meaning
+CACHE_NAMESPACE = "unified-v3"
+
+
+# -----------------------------
+# CLASS: Image decoded once
+# -----------------------------
+class SharedImage:
+    """One image, read and decoded into pixels at most once.
+
+    Every backend works on views of the same NumPy buffer: ``bgr`` is the
+    decoded image, ``gray`` is computed on first use and then shared, and
+    ``encoded`` is the original file bytes (used by ZXing, which needs an
+    encoded image) so nothing is re-encoded when the source was a file.
+    Pixels are only decoded when a backend asks for them, so a fully
+    cached image costs one file read and a hash.
+    """
+
+    def __init__(self, image, source=None):
+        self.source = source
+        self._bgr = None
+        self._gray = None
+        self._encoded = None
+        self._digest = None
+        if isinstance(image, np.ndarray):
+            self._bgr = image
+        else:
+            if isinstance(image, (str, os.PathLike)):
+                self.source = source or os.fspath(image)
+                with open(image, "rb") as f:
+                    image = f.read()
+            self._encoded = bytes(image)
+
+    @property
+    def bgr(self):
+        if self._bgr is None:
+            with span("imdecode"):
+                self._bgr = cv2.imdecode(np.frombuffer(self._encoded, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if self._bgr is None:
+                raise ValueError(f"Unable to decode image {self.source or ''}".strip())
+        return self._bgr
+
+    @property
+    def digest(self):
+        """Bytes identifying the image content, used as the cache key source."""
+        if self._digest is None:
+            if self._encoded is not None:
+                self._digest = hashlib.sha256(self._encoded).digest()
+            else:
+                arr = np.ascontiguousarray(self._bgr)
+                h = hashlib.sha256(str(arr.shape).encode("ascii"))
+                h.update(memoryview(arr).cast("B"))
+                self._digest = h.digest()
+        return self._digest
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            if self.bgr.ndim == 2:
+                self._gray = self.bgr
+            else:
+                self._gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def encoded(self):
+        if self._encoded is None:
+            # In-memory arrays only: lossless and fast to encode
+            ok, buf = cv2.imencode(".png", self.gray, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            if not ok:
+                raise ValueError("Unable to encode image for ZXing")
+            self._encoded = buf.tobytes()
+        return self._encoded
+
+    @property
+    def shape(self):
+        return self.bgr.shape
+
+
+def load_image(image, source=None):
+    """Return a SharedImage for a path, encoded bytes, ndarray or SharedImage."""
+    if isinstance(image, SharedImage):
+        return image
+    return SharedImage(image, source)
+
+
+def make_result(text, symbology, polygon, backend):
+    return {
+        "text": text,
+        "symbology": symbology,
+        "polygon": [[int(x), int(y)] for x, y in polygon] if polygon is not None else None,
+        "backend": backend,
+    }
+
+
+# -----------------------------
+# BACKENDS
+# -----------------------------
+_local = threading.local()
+
+
+def _qr_detector():
+    # cv2.QRCodeDetector is not thread-safe, so keep one per thread
+    if getattr(_local, "qr_detector", None) is None:
+        _local.qr_detector = cv2.QRCodeDetector()
+    return _local.qr_detector
+
+
+def decode_qr(shared):
+    # All QR codes in one detectAndDecodeMulti pass
+    return [
+        make_result(code["text"], code["symbology"], code["polygon"], "qr")
+        for code in detect_multi(_qr_detector(), shared.gray)
+    ]
+
+
+def decode_barcode(shared):
+    from pyzbar.pyzbar import decode as pyzbar_decode
+
+    results = []
+    for barcode in pyzbar_decode(shared.gray):
+        polygon = [(point.x, point.y) for point in barcode.polygon]
+        results.append(make_result(barcode.data.decode("utf-8", errors="replace"), barcode.type, polygon, "barcode"))
+    return results
+
+
+def decode_pdf417(shared):
+    from pdf417_tools import decode_view
+
+    # Thresholded, deskewed crop of the shared grayscale buffer first (see pdf417_tools)
+    return [make_result(text, "PDF417", None, "pdf417") for text in decode_view(shared.gray)]
+
+
+def decode_zxing(shared):
+    from zxing_container import get_container
+
+    # Warm JVM pool or warm container, whichever has been working; a backend
+    # whose breaker is open is skipped
+    backend, output = run_backends(
+        [("pool", lambda: get_pool().decode(image_request(shared.encoded))),
+         ("container", lambda: get_container().decode(shared.encoded))],
+        source_scope(shared.source) if shared.source else GLOBAL_SCOPE,
+        errors=(ZXingWorkerError,),
+        neutral=(ZXingWorkerTimeout,),
+    )
+    if backend is None:
+        raise ZXingWorkerError("no ZXing backend available")
+    record = parse_output(output, shared.source)
+    if not record["found"]:
+        return []
+    return [make_result(record["raw"], record["format"], record["points"] or None, "zxing")]
+
+
+BACKENDS = {
+    "qr": decode_qr,
+    "barcode": decode_barcode,
+    "pdf417": decode_pdf417,
+    "zxing": decode_zxing,
+}
+
+# Backends that run on a resolution pyramid when decode(pyramid=True)
+PYRAMID_BACKENDS = {"qr", "barcode"}
+
+_missing_warned = set()
+
+
+def _run_backend(name, shared, pyramid, regions, stats):
+    """One backend on the full frame or on localized crops, optionally via the pyramid."""
+    backend = BACKENDS[name]
+    use_pyramid = pyramid and name in PYRAMID_BACKENDS
+
+    def on_view(view):
+        if use_pyramid:
+            found, level = decode_pyramid(view, lambda level_view: backend(SharedImage(level_view, shared.source)))
+            return found
+        return backend(SharedImage(view, shared.source))
+
+    def on_frame():
+        # The full SharedImage keeps the original bytes for ZXing
+        return on_view(shared.gray) if use_pyramid else backend(shared)
+
+    if regions is None:
+        return on_frame()
+    # Crops are views of the shared gray buffer
+    found, report = decode_regions(shared.gray, on_view, regions, fallback=on_frame)
+    if stats is not None:
+        stats.setdefault("localization", {})[name] = report
+    return found
+
+
+def _confirm_near_duplicate(shared, region, hit, symbologies, stop_at_first, pyramid):
+    # Decode just the code region; the match only counts if it carries the same payloads
+    if region is None:
+        return None
+    x, y, w, h = region
+    crop = np.ascontiguousarray(shared.gray[y:y + h, x:x + w])
+    results = decode(crop, symbologies, stop_at_first, cache=False, pyramid=pyramid)
+    if not {result["text"] for result in hit} <= {result["text"] for result in results}:
+        return None
+    for result in results:
+        if result["polygon"] is not None:
+            result["polygon"] = [[px + x, py + y] for px, py in result["polygon"]]
+    return results
+
+
+# -----------------------------
+# FUNCTION: Decode
+# -----------------------------
+def decode(image, symbologies=SYMBOLOGIES, stop_at_first=False, cache=True, localize=False, pyramid=False,
+           stats=None, dedupe=False):
+    """Decode an image with several backends sharing one pixel buffer.
+
+    ``image`` is a path, encoded bytes, a BGR/gray ndarray or a SharedImage.
+    ``symbologies`` lists backend names from BACKENDS, tried in order. Each
+    result is a dict with ``text``, ``symbology``, ``polygon`` (list of
+    [x, y] or None), ``backend`` and ``elapsed_ms`` (that backend's time).
+    With ``stop_at_first`` the remaining backends are skipped once one finds
+    something.
+
+    Each backend first checks the decode cache (``cache=True`` uses the
+    shared one, or pass a DecodeCache, or False to skip it). Results served
+    from the cache carry ``cached: True``.
+
+    With ``localize`` each backend first sees only padded crops of the
+    regions proposed by localize.propose_regions (computed once per image)
+    and the full frame only if no crop decodes. Pass a dict as ``stats`` to
+    receive the per-backend localization reports (pixels saved).
+
+    With ``pyramid`` the QR and 1D backends try downscaled grayscale levels
+    first and move up only on failure (see pyramid.decode_pyramid); results
+    record the ``pyramid_level`` that succeeded.
+
+    With ``dedupe`` (True for the shared index, or a NearDuplicateIndex) an
+    image whose code region (see near_duplicates.code_hash) is within a few
+    bits of a recently decoded one only has that region decoded. If the
+    crop yields every payload stored for the match, its results are
+    returned with ``near_duplicate`` (the Hamming distance) and polygons
+    mapped back onto this image; otherwise the image is decoded in full.
+    Look-alike codes from one label template therefore never get each
+    other's text. For runs of nearly identical images, which the byte-hash
+    cache never matches.
+    """
+    shared = load_image(image)
+    if cache is True:
+        cache = get_cache()
+    options = {"localize": bool(localize), "pyramid": bool(pyramid)} if localize or pyramid else None
+    if dedupe:
+        if dedupe is True:
+            dedupe = get_index()
+        region = code_region(shared.gray)
+        image_hash = code_hash(shared.gray, region=region)
+        namespace = f"{CACHE_NAMESPACE}:{','.join(symbologies)}:{int(stop_at_first)}:{options}"
+        hit, distance = dedupe.get(image_hash, namespace)
+        if hit is not None:
+            confirmed = _confirm_near_duplicate(shared, region, hit, symbologies, stop_at_first, pyramid)
+            if confirmed is not None:
+                return [dict(result, near_duplicate=distance) for result in confirmed]
+            dedupe.reject()
+        results = decode(shared, symbologies, stop_at_first, cache, localize, pyramid, stats)
+        dedupe.put(image_hash, [dict(result) for result in results], namespace)
+        return results
+    regions = None
+    results = []
+    for name in symbologies:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown symbology backend: {name}")
+        key = cache_key(shared.digest, f"{CACHE_NAMESPACE}:{name}", options) if cache else None
+        hit = cache.get(key) if cache else None
+        if hit is not None:
+            found = [dict(result, cached=True) for result in hit]
+            results.extend(found)
+            if found and stop_at_first:
+                break
+            continue
+        start = time.perf_counter()
+        try:
+            if localize and regions is None:
+                with span("localize"):
+                    regions = propose_regions(shared.gray)
+            with span("backend_decode", backend=name):
+                found = _run_backend(name, shared, pyramid, regions if localize else None, stats)
+        except ImportError as e:
+            # Optional dependency missing: skip this backend, warn once
+            if name not in _missing_warned:
+                _missing_warned.add(name)
+                print(f"Warning: {name} backend unavailable ({e})", file=sys.stderr)
+            continue
+        except ZXingWorkerError as e:
+            incr("decode_failures", stage="backend", backend=name)
+            print(f"Warning: {name} backend failed ({e})", file=sys.stderr)
+            continue
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for result in found:
+            result["elapsed_ms"] = round(elapsed_ms, 3)
+        if cache:
+            cache.put(key, found)
+        results.extend(found)
+        if found and stop_at_first:
+            break
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    if len(sys.argv) < 2:
+        print(f"Usage: {sys.argv[0]} IMAGE [BACKEND ...]")
+        sys.exit(1)
+    backends = sys.argv[2:] or SYMBOLOGIES
+    start = time.perf_counter()
+    for result in decode(sys.argv[1], backends):
+        print(json.dumps(result, ensure_ascii=False))
+    print(f"Total: {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
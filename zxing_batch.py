@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from jvm_launch import runner_command
+from zxing_worker import JAR_DIR, file_uri
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff"}
+
+# Kept well below the Windows command-line limit (~32K characters)
+DEFAULT_CHUNK_SIZE = 100
+
+# First line of every per-file block in CommandLineRunner output
+HEADER_RE = re.compile(r"^(?P<uri>\S.*?)(?: \(format: (?P<format>[^,]+), type: (?P<type>[^)]+)\):|: (?P<status>No barcode found|.+))$")
+POINT_RE = re.compile(r"^\s+Point \d+: \(([-\d.eE]+),([-\d.eE]+)\)")
+
+
+def collect_images(inputs, recursive=True):
+    """Expand files and directories into a sorted list of image paths."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                        paths.append(os.path.join(root, name))
+                if not recursive:
+                    break
+        elif os.path.isfile(item):
+            paths.append(item)
+        else:
+            print(f"Warning: {item} not found, skipping.")
+    return paths
+
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def batch_command(uris):
+    """One CommandLineRunner invocation for a whole chunk of file URIs."""
+    return runner_command(list(uris))
+
+
+def _uri_key(uri):
+    # CommandLineRunner may echo a URI with different quoting or slashes
+    return unquote(uri).replace("\\", "/").split("file:", 1)[-1].lstrip("/")
+
+
+def empty_record(path, error=None):
+    return {
+        "path": path,
+        "found": False,
+        "format": None,
+        "type": None,
+        "raw": "",
+        "parsed": "",
+        "points": [],
+        "error": error,
+    }
+
+
+def parse_batch_output(output, paths):
+    """Split multi-file CommandLineRunner output back into per-file records.
+
+    Returns one record per entry of ``paths`` (in the same order). Files that
+    do not appear in the output are reported with ``error`` set.
+    """
+    records = {_uri_key(file_uri(p)): empty_record(p) for p in paths}
+    seen = _parse_blocks(output, records)
+    for key, record in records.items():
+        if key not in seen:
+            record["error"] = "No output from ZXing"
+    return list(records.values())
+
+
+def parse_output(output, path=None):
+    """Parse the output for a single image (worker or CommandLineRunner)."""
+    record = empty_record(path)
+    for line in output.splitlines():
+        header = HEADER_RE.match(line)
+        if header:
+            _parse_blocks(output, {_uri_key(header.group("uri")): record})
+            break
+    return record
+
+
+def decode_found(output):
+    """Whether single-image output holds a real result, i.e. a ``(format: ...)`` header.
+
+    "No barcode found", "Could not load image" and other error replies
+    from the worker or CommandLineRunner all count as misses.
+    """
+    return parse_output(output)["found"]
+
+
+def _parse_blocks(output, records):
+    """Fill ``records`` (keyed by _uri_key) from output; returns the keys seen."""
+    seen = set()
+    current = None
+    section = None
+    raw_lines, parsed_lines = [], []
+
+    def flush():
+        if current is not None and current["found"]:
+            current["raw"] = "\n".join(raw_lines).strip()
+            current["parsed"] = "\n".join(parsed_lines).strip()
+
+    for line in output.splitlines():
+        header = HEADER_RE.match(line)
+        key = _uri_key(header.group("uri")) if header else None
+        if key in records:
+            flush()
+            seen.add(key)
+            current, section = records[key], None
+            raw_lines, parsed_lines = [], []
+            if header.group("format"):
+                current.update(found=True, format=header.group("format"), type=header.group("type"))
+            elif header.group("status") != "No barcode found":
+                current["error"] = header.group("status")
+            continue
+        if current is None:
+            continue
+        if line == "Raw result:":
+            section = "raw"
+        elif line == "Parsed result:":
+            section = "parsed"
+        elif line.startswith("Found ") and line.endswith("result points."):
+            section = "points"
+        elif section == "points":
+            point = POINT_RE.match(line)
+            if point:
+                current["points"].append([int(float(point.group(1))), int(float(point.group(2)))])
+        elif section == "raw":
+            raw_lines.append(line)
+        elif section == "parsed":
+            parsed_lines.append(line)
+    flush()
+    return seen
+
+
+def decode_chunk(paths):
+    """Decode one chunk of images with a single JVM start."""
+    try:
+        result = subprocess.run(batch_command([file_uri(p) for p in paths]), capture_output=True, text=True, cwd=JAR_DIR)
+    except OSError as e:
+        return [empty_record(p, f"Error running Java: {e}") for p in paths]
+    # CommandLineRunner exits non-zero when some files had no barcode, so the
+    # output is parsed whatever the return code is
+    return parse_batch_output(result.stdout, paths)
+
+
+def decode_batch(paths, chunk_size=DEFAULT_CHUNK_SIZE, jobs=1):
+    """Decode many images, ``chunk_size`` per JVM call; yields per-file records.
+
+    With ``jobs`` > 1 several chunks run at the same time. Records are
+    yielded chunk by chunk in input order.
+    """
+    chunks = list(chunked(list(paths), chunk_size))
+    if jobs <= 1:
+        for chunk in chunks:
+            yield from decode_chunk(chunk)
+        return
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for records in executor.map(decode_chunk, chunks):
+            yield from records
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode many images with one ZXing JVM per chunk.")
+    parser.add_argument("inputs", nargs="+", help="image files and/or directories")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="images per JVM call")
+    parser.add_argument("--jobs", type=int, default=1, help="chunks decoded at the same time")
+    parser.add_argument("--no-recursive", action="store_true", help="do not descend into subdirectories")
+    parser.add_argument("--output", help="write JSON lines here instead of stdout")
+    args = parser.parse_args(argv)
+
+    paths = collect_images(args.inputs, recursive=not args.no_recursive)
+    if not paths:
+        print("No images found.")
+        return 1
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    found = 0
+    try:
+        for record in decode_batch(paths, args.chunk_size, args.jobs):
+            found += record["found"]
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if args.output:
+            out.close()
+    print(f"Decoded {found}/{len(paths)} images.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
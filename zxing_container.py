@@ -0,0 +1,142 @@
+import atexit
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+from urllib.parse import quote
+
+from jvm_launch import WORKER_FLAGS
+from metrics import incr, span
+from zxing_worker import (
+    CORE_JAR,
+    JAR_DIR,
+    JAVASE_JAR,
+    JCOMMANDER_JAR,
+    WORKER_SOURCE,
+    ZXingWorkerError,
+    ZXingWorkerPool,
+    image_request,
+)
+
+# -----------------------------
+# CONFIG: Container layout
+# -----------------------------
+DOCKER_IMAGE = os.environ.get("ZXING_DOCKER_IMAGE", "openjdk:17")
+CONTAINER_JAR_DIR = "/zxing"
+CONTAINER_DATA_DIR = "/data"
+
+
+# -----------------------------
+# CLASS: Warm ZXing container
+# -----------------------------
+class ZXingContainer:
+    """One long-running container with the ZXing jars and an image folder mounted.
+
+    The first decode starts the container (``sleep infinity``) and ZXing
+    workers inside it through ``docker exec -i`` (up to ``workers`` of them,
+    started as concurrent decodes need them). Later decodes go straight to
+    those workers, so neither container creation nor JVM startup is paid
+    again. The container is removed at interpreter exit.
+    """
+
+    def __init__(self, data_dir=None, image=DOCKER_IMAGE, workers=4, timeout=30.0, startup_timeout=180.0):
+        self.data_dir = os.path.abspath(data_dir or os.getcwd())
+        self.image = image
+        self.name = f"zxing-{uuid.uuid4().hex[:12]}"
+        self.started = False
+        self.workers = ZXingWorkerPool(workers, self.exec_command, timeout=timeout, startup_timeout=startup_timeout)
+        self._lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def run_command(self):
+        return [
+            "docker", "run", "-d", "--rm",
+            "--name", self.name,
+            "-v", f"{JAR_DIR}:{CONTAINER_JAR_DIR}:ro",
+            "-v", f"{self.data_dir}:{CONTAINER_DATA_DIR}:ro",
+            self.image,
+            "sleep", "infinity",
+        ]
+
+    def exec_command(self):
+        # Classpath inside the Linux container always uses ':'
+        classpath = ":".join(
+            f"{CONTAINER_JAR_DIR}/{os.path.basename(jar)}" for jar in [JAVASE_JAR, CORE_JAR, JCOMMANDER_JAR]
+        )
+        return [
+            "docker", "exec", "-i", self.name,
+            # Same startup flags as a local worker; the host's CDS archive does not fit the image's JDK
+            "java", *WORKER_FLAGS, "-cp", classpath, f"{CONTAINER_JAR_DIR}/{os.path.basename(WORKER_SOURCE)}",
+        ]
+
+    def healthy(self):
+        """True if the container exists and is running."""
+        if not self.started:
+            return False
+        result = subprocess.run(
+            ["docker", "inspect", "-f", "{{.State.Running}}", self.name],
+            capture_output=True, text=True,
+        )
+        return result.returncode == 0 and result.stdout.strip() == "true"
+
+    def start(self):
+        if self.started:
+            return
+        if shutil.which("docker") is None:
+            raise ZXingWorkerError("docker not found on PATH")
+        with span("container_start"):
+            result = subprocess.run(self.run_command(), capture_output=True, text=True)
+        if result.returncode != 0:
+            raise ZXingWorkerError(f"Could not start ZXing container: {result.stderr.strip()}")
+        self.started = True
+
+    def stop(self):
+        self.workers.close()
+        if self.started:
+            subprocess.run(["docker", "rm", "-f", self.name], capture_output=True)
+            self.started = False
+
+    def container_request(self, image):
+        """Worker request for a host image path or in-memory image bytes.
+
+        Paths under the mounted folder are read by the container directly;
+        anything else is sent over stdin.
+        """
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return image_request(image)
+        rel = os.path.relpath(os.path.abspath(image), self.data_dir)
+        if rel.startswith(os.pardir):
+            with open(image, "rb") as f:
+                return image_request(f.read())
+        return f"file://{CONTAINER_DATA_DIR}/{quote(rel.replace(os.sep, '/'))}"
+
+    def decode(self, image, timeout=None):
+        """Decode a host image path or encoded image bytes in the warm container."""
+        request = self.container_request(image)
+        with self._lock:
+            self.start()
+        try:
+            return self.workers.decode(request, timeout)
+        except ZXingWorkerError:
+            with self._lock:
+                if self.healthy():
+                    raise
+                # The container died underneath us: start a fresh one and retry once
+                incr("container_restarts")
+                self.stop()
+                self.start()
+        return self.workers.decode(request, timeout)
+
+
+_default_container = None
+_default_container_lock = threading.Lock()
+
+
+def get_container(data_dir=None):
+    """Return the shared container for this process (created on first use)."""
+    global _default_container
+    with _default_container_lock:
+        if _default_container is None:
+            _default_container = ZXingContainer(data_dir, workers=int(os.environ.get("ZXING_WORKERS", "4")))
+        return _default_container
@@ -0,0 +1,331 @@
+import atexit
+import base64
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import quote
+
+from metrics import incr, span
+
+# -----------------------------
+# CONFIG: Paths to ZXing JARs
+# -----------------------------
+JAR_DIR = os.path.dirname(os.path.abspath(__file__))
+JAVASE_JAR = os.path.join(JAR_DIR, "javase-3.5.0.jar")
+CORE_JAR = os.path.join(JAR_DIR, "core-3.5.0.jar")
+JCOMMANDER_JAR = os.path.join(JAR_DIR, "jcommander-1.82.jar")
+WORKER_SOURCE = os.path.join(JAR_DIR, "ZXingWorker.java")
+
+# Line the Java worker prints after every response
+END_MARKER = "@@END@@"
+# Seconds decode_first waits before starting the next candidate alongside a running one
+RACE_STAGGER = float(os.environ.get("ZXING_RACE_STAGGER_MS", "100")) / 1000.0
+
+
+class ZXingWorkerError(RuntimeError):
+    """Raised when the ZXing worker cannot start, crashes or times out."""
+
+
+class ZXingWorkerTimeout(ZXingWorkerError):
+    """Raised when a single request takes longer than its timeout."""
+
+
+def file_uri(image_path):
+    """Build a file:/// URI that ZXing accepts on Windows and POSIX."""
+    image_abs_forward = os.path.abspath(image_path).replace("\\", "/")
+    return f"file:///{quote(image_abs_forward.lstrip('/'))}"
+
+
+def image_request(image):
+    """Worker request line for an image path or in-memory encoded image bytes."""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return "b64:" + base64.b64encode(image).decode("ascii")
+    return file_uri(image)
+
+
+_private_tmp_dir = None
+
+
+def spill_to_temp(data, suffix=".png"):
+    """Write encoded image bytes into this process's private temp folder.
+
+    Only used when a decode path needs a real file (the one-shot
+    CommandLineRunner fallback). The folder is created with mkdtemp, so it is
+    unique per invocation, and it is removed at exit.
+    """
+    global _private_tmp_dir
+    if _private_tmp_dir is None:
+        _private_tmp_dir = tempfile.mkdtemp(prefix="zxing_")
+        atexit.register(shutil.rmtree, _private_tmp_dir, True)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=_private_tmp_dir)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
+
+
+def worker_command():
+    """Command that starts the worker JVM (uses the Java 11+ source launcher).
+
+    Startup flags and the class data sharing archive come from jvm_launch.
+    """
+    from jvm_launch import java_command
+
+    return java_command([WORKER_SOURCE], profile="worker")
+
+
+# -----------------------------
+# CLASS: One long-lived JVM
+# -----------------------------
+class ZXingWorker:
+    """A single JVM that keeps the ZXing jars loaded between decodes.
+
+    Requests are written to the worker's stdin one per line and the reply is
+    read back from stdout up to END_MARKER. If the JVM dies or a request
+    times out, the process is killed and started again on the next request.
+    """
+
+    def __init__(self, command=None, timeout=30.0, startup_timeout=60.0):
+        self.command = command
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self._lines = None
+        self._lock = threading.Lock()
+
+    def _command(self):
+        return self.command() if callable(self.command) else (self.command or worker_command())
+
+    def _pump(self, stream, lines):
+        # Reader thread: move stdout lines into a queue so reads can time out
+        for line in stream:
+            lines.put(line.rstrip("\r\n"))
+        lines.put(None)
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        if self.alive():
+            return
+        command = self._command()
+        if shutil.which(command[0]) is None:
+            raise ZXingWorkerError(f"{command[0]} not found on PATH")
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+            cwd=JAR_DIR,
+        )
+        self._lines = queue.Queue()
+        threading.Thread(target=self._pump, args=(self.process.stdout, self._lines), daemon=True).start()
+        # The first request also waits for the JVM to boot and compile the worker
+        with span("jvm_worker_start", launcher=os.path.basename(command[0])):
+            reply = self._request("PING", self.startup_timeout)
+        if reply.strip() != "PONG":
+            self.stop()
+            raise ZXingWorkerError(f"Unexpected reply from ZXing worker: {reply!r}")
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=2)
+        except Exception:
+            # Did not exit on its own: kill it and wait, or it stays behind as a zombie
+            self._reap()
+        self.process = None
+
+    def _reap(self):
+        # Kill and wait, so a dead or stuck JVM does not linger as a zombie
+        try:
+            self.process.kill()
+            self.process.wait(timeout=5)
+        except Exception:
+            pass
+        self.process = None
+
+    def _request(self, line, timeout):
+        try:
+            self.process.stdin.write(line + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            self.stop()
+            raise ZXingWorkerError(f"ZXing worker is not running: {e}")
+
+        deadline = time.monotonic() + timeout
+        out = []
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise queue.Empty
+                item = self._lines.get(timeout=remaining)
+            except queue.Empty:
+                self._reap()
+                raise ZXingWorkerTimeout(f"ZXing worker timed out after {timeout:.1f}s")
+            if item is None:
+                self._reap()
+                raise ZXingWorkerError("ZXing worker exited unexpectedly")
+            if item == END_MARKER:
+                return "\n".join(out)
+            out.append(item)
+
+    def decode(self, request, timeout=None):
+        """Decode one request (see image_request) and return ZXing's text output.
+
+        A crashed worker is restarted once before giving up.
+        """
+        with self._lock:
+            for attempt in range(2):
+                self.start()
+                try:
+                    return self._request(request, timeout or self.timeout).strip()
+                except ZXingWorkerTimeout:
+                    # Timeouts are not retried, the image itself is the problem
+                    incr("decode_failures", stage="zxing_worker", reason="timeout")
+                    raise
+                except ZXingWorkerError:
+                    if attempt == 1:
+                        incr("decode_failures", stage="zxing_worker", reason="crash")
+                        raise
+                    incr("worker_restarts")
+
+
+# -----------------------------
+# CLASS: Small pool of workers
+# -----------------------------
+class ZXingWorkerPool:
+    """Fixed-size pool of ZXingWorker processes, started lazily."""
+
+    def __init__(self, size=4, command=None, timeout=30.0, startup_timeout=60.0):
+        self.size = size
+        self._idle = queue.Queue()
+        self._workers = []
+        for _ in range(size):
+            worker = ZXingWorker(command, timeout=timeout, startup_timeout=startup_timeout)
+            self._workers.append(worker)
+            self._idle.put(worker)
+
+    def decode(self, request, timeout=None):
+        worker = self._idle.get()
+        try:
+            return worker.decode(request, timeout)
+        finally:
+            self._idle.put(worker)
+
+    def close(self):
+        for worker in self._workers:
+            worker.stop()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_pool(size=None):
+    """Return the shared process-wide worker pool (created on first use)."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ZXingWorkerPool(size or int(os.environ.get("ZXING_WORKERS", "4")))
+            atexit.register(_default_pool.close)
+        return _default_pool
+
+
+# -----------------------------
+# FUNCTION: First-success decode
+# -----------------------------
+def _candidate_kind(label):
+    # roi0, roi1, ... share one metric label; rot90/rot180/rot270 stay distinct
+    return "roi" if label.startswith("roi") else label
+
+
+def _decode_candidate(decode, label, image):
+    kind = _candidate_kind(label)
+    incr("candidate_attempts", candidate=kind)
+    start = time.perf_counter()
+    with span("candidate_decode", candidate=kind):
+        output = decode(image)
+    return output, (time.perf_counter() - start) * 1000
+
+
+def decode_first(candidates, decode, succeeded, max_workers=4, cancel=None, stagger=RACE_STAGGER, outcomes=None):
+    """Decode labelled candidates in order and return the first success.
+
+    candidates is a list of (label, image) pairs, decode(image) returns ZXing
+    output and succeeded(output) says whether it holds a real result.
+    Candidates start one at a time: the next one only when a running one
+    has failed or ``stagger`` seconds have passed, and never more than
+    ``max_workers`` at once. So an early candidate that decodes quickly
+    wins before the later ones are even sent to ZXing.
+
+    On the first success nothing more is started, ``cancel`` (a
+    threading.Event, if given) is set, and (label, output) is returned.
+    Decodes already running cannot be interrupted inside the JVM; decode()
+    should check ``cancel`` before each request it sends, so they stop at
+    the next step. If none succeeds the result is (None, output of the
+    first candidate).
+
+    Pass a list as ``outcomes`` to receive (label, succeeded, latency_ms)
+    for every candidate that actually finished before the race ended;
+    candidates still running or never started are not listed.
+    """
+    if not candidates:
+        return None, ""
+    max_workers = max(1, max_workers)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {}
+    outputs = {}
+    next_index = 0
+    last_start = 0.0
+    try:
+        while next_index < len(candidates) or futures:
+            # Start the next candidate when a slot is free and the stagger has passed
+            if next_index < len(candidates) and len(futures) < max_workers and (
+                    not futures or time.monotonic() - last_start >= stagger):
+                label, image = candidates[next_index]
+                futures[executor.submit(_decode_candidate, decode, label, image)] = next_index
+                next_index += 1
+                last_start = time.monotonic()
+                continue
+            timeout = None
+            if next_index < len(candidates) and len(futures) < max_workers:
+                timeout = max(0.0, stagger - (time.monotonic() - last_start))
+            done, _ = wait(set(futures), timeout=timeout, return_when=FIRST_COMPLETED)
+            # Prefer the earliest candidate when several finish together
+            for future in sorted(done, key=futures.get):
+                i = futures.pop(future)
+                output, elapsed_ms = future.result()
+                outputs[i] = output
+                won = succeeded(output)
+                if outcomes is not None:
+                    outcomes.append((candidates[i][0], won, elapsed_ms))
+                if won:
+                    incr("candidate_success", candidate=_candidate_kind(candidates[i][0]))
+                    return candidates[i][0], output
+        return None, outputs.get(0, "")
+    finally:
+        if cancel is not None:
+            cancel.set()
+        # Nothing queued is left; running decodes see ``cancel`` and stop early
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    import sys
+
+    pool = get_pool()
+    for path in sys.argv[1:]:
+        start = time.perf_counter()
+        print(pool.decode(file_uri(path)))
+        print(f"({(time.perf_counter() - start) * 1000:.1f} ms)")